@@ -0,0 +1,190 @@
+import numpy as np
+from bitboard import LEFT_DIRS, RIGHT_DIRS, LINE_AXES, get_env_bits
+from evalcache import cache_key
+
+# numpy versions of the bitboard tables, so the same shift-and-mask code runs
+# over arrays of positions
+U64 = np.uint64
+LEFT_DIRS_NP = tuple((U64(shift), U64(mask)) for shift, mask in LEFT_DIRS)
+RIGHT_DIRS_NP = tuple((U64(shift), U64(mask)) for shift, mask in RIGHT_DIRS)
+LINE_AXES_NP = tuple(tuple(U64(v) for v in axis) for axis in LINE_AXES)
+
+CORNERS = U64(0x8100000000000081)
+# empty corner square and the three squares next to it
+CORNER_ADJACENT = (
+    (U64(1 << 0), U64((1 << 1) | (1 << 8) | (1 << 9))),
+    (U64(1 << 7), U64((1 << 6) | (1 << 15) | (1 << 14))),
+    (U64(1 << 56), U64((1 << 48) | (1 << 57) | (1 << 49))),
+    (U64(1 << 63), U64((1 << 55) | (1 << 62) | (1 << 54))),
+)
+ZERO = U64(0)
+
+# heuristic weights: mobility, coin parity, corners, stability, corner
+# closeness (subtracted) and potential mobility, which is off by default
+WEIGHTS = (10, 70, 800, 50, 300, 0)
+
+if hasattr(np, 'bitwise_count'):
+    def popcount(bits):
+        return np.bitwise_count(bits).astype(np.int64)
+else:
+    def popcount(bits):
+        bytes_ = np.ascontiguousarray(bits).view(np.uint8).reshape(-1, 8)
+        return np.unpackbits(bytes_, axis=1).sum(axis=1).astype(np.int64)
+
+
+def boards_to_bits(boards, piece):
+    # (N, 8, 8) boards indexed [n, x, y] -> N bitboards with square (x, y) at bit 8*y + x
+    boards = np.asarray(boards)
+    flat = boards.transpose(0, 2, 1).reshape(len(boards), 64) == piece
+    packed = np.packbits(flat, axis=1, bitorder='little')
+    return np.ascontiguousarray(packed).view('<u8').ravel().astype(U64)
+
+def get_moves_batch(p, o):
+    empty = ~(p | o)
+    moves = np.zeros_like(p)
+    for shift, mask in LEFT_DIRS_NP:
+        mo = mask & o
+        t = (p << shift) & mo
+        for _ in range(5):
+            t |= (t << shift) & mo
+        moves |= (t << shift) & mask
+    for shift, mask in RIGHT_DIRS_NP:
+        mo = mask & o
+        t = (p >> shift) & mo
+        for _ in range(5):
+            t |= (t >> shift) & mo
+        moves |= (t >> shift) & mask
+    return moves & empty
+
+def get_potential_moves_batch(p, o):
+    # array version of bitboard.get_potential_moves_bb
+    near = np.zeros_like(p)
+    for shift, mask in LEFT_DIRS_NP:
+        near |= (o << shift) & mask
+    for shift, mask in RIGHT_DIRS_NP:
+        near |= (o >> shift) & mask
+    return near & ~(p | o)
+
+def get_stability_batch(p, o):
+    # array version of bitboard.get_stability_bb
+    occ = p | o
+    stable = [p.copy(), o.copy()]
+    danger = [np.zeros_like(p), np.zeros_like(p)]
+    for shift, up, down, edge_lo, edge_hi in LINE_AXES_NP:
+        lo = occ & edge_lo
+        hi = occ & edge_hi
+        for _ in range(7):
+            lo |= occ & (lo << shift) & up
+            hi |= occ & (hi >> shift) & down
+        anchored = lo | hi
+        for side, (color, opp) in enumerate(((p, o), (o, p))):
+            opp_lo = (opp << shift) & up
+            opp_hi = (opp >> shift) & down
+            for _ in range(6):
+                opp_lo |= ((opp_lo & color) << shift) & up
+                opp_hi |= ((opp_hi & color) >> shift) & down
+            protected = (anchored | (opp_lo & opp_hi)) & color
+            stable[side] &= protected
+            danger[side] |= (opp_lo | opp_hi) & color & ~protected
+    danger[0] &= ~stable[0]
+    danger[1] &= ~stable[1]
+    unprot_p = p & ~stable[0] & ~danger[0]
+    unprot_o = o & ~stable[1] & ~danger[1]
+    return (popcount(stable[0]), popcount(stable[1]), popcount(danger[0]),
+            popcount(danger[1]), popcount(unprot_p), popcount(unprot_o))
+
+def ratio(a, b):
+    # 100 * (a - b) / (a + b), or 0 where both are 0
+    total = a + b
+    return np.where(total != 0, 100 * (a - b) / np.where(total != 0, total, 1), 0)
+
+def heuristic_batch(max_player, black, white=None, weights=WEIGHTS):
+    # scores N positions for max_player (a scalar or one per position), given
+    # either an (N, 8, 8) array of boards or N black and N white bitboards;
+    # matches minimax.heuristic exactly
+    if white is None:
+        boards = black
+        black = boards_to_bits(boards, 1)
+        white = boards_to_bits(boards, -1)
+    black = np.asarray(black, dtype=U64)
+    white = np.asarray(white, dtype=U64)
+    max_is_black = np.broadcast_to(np.asarray(max_player) == 1, black.shape)
+    p = np.where(max_is_black, black, white)
+    o = np.where(max_is_black, white, black)
+
+    m = ratio(popcount(get_moves_batch(p, o)), popcount(get_moves_batch(o, p)))
+    coins = ratio(popcount(p), popcount(o))
+    c = 25 * (popcount(p & CORNERS) - popcount(o & CORNERS))
+
+    max_close = np.zeros(black.shape, dtype=np.int64)
+    min_close = np.zeros(black.shape, dtype=np.int64)
+    empty = ~(p | o)
+    for corner, adjacent in CORNER_ADJACENT:
+        open_corner = (empty & corner) != ZERO
+        max_close += np.where(open_corner, popcount(p & adjacent), 0)
+        min_close += np.where(open_corner, popcount(o & adjacent), 0)
+    l = 12.5 * (max_close - min_close)
+
+    # same weights and order of operations as stability_heuristic
+    s, s2, d, d2, u, u2 = get_stability_batch(p, o)
+    score_p = 1*s + -1*d + -0.05*u
+    score_o = 1*s2 + -1*d2 + -0.05*u2
+    total = score_p + score_o
+    s = np.where(total != 0, 100 * (score_p - score_o) / np.where(total != 0, total, 1), 0)
+
+    w_m, w_p, w_c, w_s, w_l, w_f = weights
+    if w_f:
+        f = ratio(popcount(get_potential_moves_batch(p, o)), popcount(get_potential_moves_batch(o, p)))
+        return w_m*m + w_p*coins + w_c*c + w_s*s - w_l*l + w_f*f
+    return w_m*m + w_p*coins + w_c*c + w_s*s - w_l*l
+
+def final_value(max_player, env):
+    # value of a finished game as the search scores it: +/-inf for a win or a
+    # loss, 0 for a draw
+    leader = env.get_leader()
+    if leader == max_player:
+        return float('inf')
+    elif leader == -max_player:
+        return float('-inf')
+    return 0
+
+def leaf_values(max_player, env, moves, weights=WEIGHTS, evaluator=None, cache=None):
+    # values of the positions after each move, scored together; full boards
+    # get their final_value as in the search. evaluator is an optional
+    # patterns.PatternEvaluator to use in place of the heuristic, and cache an
+    # optional evalcache.EvalCache: only the positions missing from it are scored.
+    # like the search's single leaves, each position is scored for its own
+    # player to move and negated; the pattern evaluator isn't symmetric
+    # between the two players, so scoring it for max_player would differ
+    opp = -max_player
+    values = []
+    blacks = []
+    whites = []
+    misses = [] # (index in values, cache key) of the positions to score
+    for move in moves:
+        undo = env.make_move(move)
+        if env.get_num_empty() == 0:
+            values.append(final_value(max_player, env))
+        else:
+            key = cache_key(opp, env) if cache is not None else None
+            value = cache.get(key) if cache is not None else None
+            values.append(None if value is None else -value)
+            if value is None:
+                b, w = get_env_bits(env, env.black)
+                blacks.append(b)
+                whites.append(w)
+                misses.append((len(values) - 1, key))
+        env.unmake_move(undo)
+    if not misses:
+        return values
+    blacks = np.array(blacks, dtype=U64)
+    whites = np.array(whites, dtype=U64)
+    if evaluator is not None:
+        scores = evaluator.evaluate_batch(opp, blacks, whites)
+    else:
+        scores = heuristic_batch(opp, blacks, whites, weights=weights)
+    for (i, key), score in zip(misses, scores.tolist()):
+        values[i] = -score
+        if cache is not None:
+            cache.put(key, score)
+    return values
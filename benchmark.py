@@ -0,0 +1,939 @@
+from othello import Othello
+from bitboard import BitboardOthello, FULL
+from endgame import solve_endgame
+from batch import heuristic_batch, final_value
+from parallel import ParallelSearch
+from ordering import MoveOrdering
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from book import OpeningBook, build_book, write_book
+from symmetry import canonical_bits_batch
+from bitboard import get_env_bits
+from engine import Engine
+from patterns import PatternEvaluator, NUM_PHASES, TABLE_SIZE
+from batch import leaf_values
+from stats import SearchHooks, JsonLinesExporter
+from records import write_transcript, read_transcript, write_database, PositionDatabase, random_games
+from server import EngineServer
+from loadtest import make_positions, load_test, format_results
+from position import Position, transform_env, same_position
+from suite import perft, check_perft, PERFT_COUNTS
+import asyncio
+import contextlib
+import json
+import os
+import pickle
+import numpy as np
+import minimax
+import random
+import copy
+import sys
+import tempfile
+import time
+
+
+class ScanOthello(Othello):
+    # the original move generation, which scans all 64 squares and walks
+    # each direction with bounds checks; kept to measure the ray tables against
+    def get_moves(self):
+        moves = []
+        for y, arr in enumerate(self.board):
+            for x, p in enumerate(arr):
+                if self.is_valid(x, y):
+                    moves.append((x, y))
+        if len(moves) == 0:
+            return None
+        if self.turn == self.black:
+            self.blackpass = False
+        elif self.turn == self.white:
+            self.whitepass = False
+        return moves
+
+    def make_move(self, move):
+        # returns an undo record for unmake_move
+        undo = (move, [], self.get_piece(move[0], move[1]) if move else 0, self.turn, self.blackpass, self.whitepass, self.hash)
+        if not move:
+            self.turn = self.get_opp()
+            if self.turn == self.black:
+                self.blackpass = True
+            elif self.turn == self.white:
+                self.whitepass = True
+            return undo
+        x = move[0]
+        y = move[1]
+        self.add_piece(self.get_turn(), x, y)
+
+        # go in each direction until another of the same color is reached
+        # if not, can't go in that direction
+        # basically have a square around x, y that grows
+        sq_dirs = np.array([[-1,-1],[-1,0],[-1,1],[0,-1],[0,1],[1,-1],[1,0],[1,1]])
+        sq_points = np.array([[x,y] for _ in range(8)])
+        
+        sq_points = sq_points + sq_dirs # move in each direction
+        sq_flips = [[] for _ in range(8)]
+        sq_valid = np.array([False for _ in range(8)])
+
+        # if opponent in that direction
+        for i, sq in enumerate(sq_points):
+            if sq[0] < 0 or sq[1] < 0 or sq[0] >= 8 or sq[1] >= 8:
+                continue
+            if self.get_piece(sq[0], sq[1]) == self.get_opp():
+                sq_flips[i].append(sq)
+                sq_valid[i] = True
+
+        while True:
+            sq_points = sq_points + sq_dirs # move in each direction
+
+            # if opponent in that direction
+            for i, sq in enumerate(sq_points):
+                if sq[0] < 0 or sq[1] < 0 or sq[0] >= 8 or sq[1] >= 8 or not sq_valid[i]:
+                    sq_valid[i] = False
+                    continue
+                if self.get_piece(sq[0], sq[1]) == self.get_opp():
+                    sq_flips[i].append(sq)
+                elif self.get_piece(sq[0], sq[1]) == self.get_turn() and len(sq_flips) != 0:
+                    # as plain ints, since the board keeps bitmasks of its squares
+                    flips = [(int(sq2[0]), int(sq2[1])) for sq2 in sq_flips[i]]
+                    for sq2 in flips:
+                        self.flip_piece(sq2[0], sq2[1])
+                    undo[1].extend(flips)
+                    sq_flips[i] = []
+                    sq_valid[i] = False
+                else:
+                    sq_valid[i] = False
+            if not np.any(sq_valid):
+                break
+        self.turn = self.get_opp()
+        return undo
+
+    def is_valid(self, x, y):
+        # go in each direction until another of the same color is reached
+        # if not, can't go in that direction
+        # basically have a square around x, y that grows
+        if self.get_piece(x, y) != 0:
+            return False
+        
+        sq_dirs = np.array([[-1,-1],[-1,0],[-1,1],[0,-1],[0,1],[1,-1],[1,0],[1,1]])
+        sq_points = np.array([[x,y] for _ in range(8)])
+        
+        sq_points = sq_points + sq_dirs # move in each direction
+        sq_valid = np.array([False for _ in range(8)])
+
+        # if opponent in that direction
+        for i, sq in enumerate(sq_points):
+            if sq[0] < 0 or sq[1] < 0 or sq[0] >= 8 or sq[1] >= 8:
+                continue
+            if self.get_piece(sq[0], sq[1]) == self.get_opp():
+                sq_valid[i] = True
+
+        if not np.any(sq_valid):
+            return False
+
+        while True:
+            sq_points = sq_points + sq_dirs # move in each direction
+
+            # if opponent in that direction
+            for i, sq in enumerate(sq_points):
+                if sq[0] < 0 or sq[1] < 0 or sq[0] >= 8 or sq[1] >= 8 or not sq_valid[i]:
+                    sq_valid[i] = False
+                    continue
+                if self.get_piece(sq[0], sq[1]) == self.get_opp():
+                    sq_valid[i] = True
+                elif self.get_piece(sq[0], sq[1]) == self.get_turn() and sq_valid[i]:
+                    return True
+                else:
+                    sq_valid[i] = False
+            if not np.any(sq_valid):
+                return False
+            
+        return False
+
+# the original two-function search, kept to measure negamax against
+def MaxValue(player, env, alpha, beta, depth, max_depth, num_states, tt=None, batch=False, ordering=None, first_move=None):
+    num_states[0] += 1
+    if env.get_num_empty() == 0:
+        return final_value(player, env), None
+    if depth >= max_depth: # evaluate node with utility function if maxdepth reached
+        return minimax.heuristic(player, env), None
+    alpha_orig, beta_orig = alpha, beta
+    entry = None
+    if tt is not None:
+        key = env.get_hash()
+        entry, usable = minimax.probe_tt(tt, key, depth, max_depth)
+        if usable:
+            _, flag, tt_value, tt_move = entry
+            if flag == EXACT:
+                return tt_value, tt_move
+            elif flag == LOWER:
+                alpha = max(alpha, tt_value)
+            elif flag == UPPER:
+                beta = min(beta, tt_value)
+            if alpha >= beta:
+                return tt_value, tt_move
+    moves = env.get_moves()
+    value = float('-inf')
+    best_move = None
+    if not moves:
+        if not env.has_moves(-player):
+            return final_value(player, env), None
+        undo = env.make_move(None)
+        value, move2 = MinValue(-player, env, alpha, beta, depth+1, max_depth, num_states, tt, batch, ordering)
+        env.unmake_move(undo)
+        return value, None
+    if ordering is not None:
+        ordering.order(moves, depth)
+    if entry:
+        minimax.order_tt_move(moves, entry[3])
+    if first_move:
+        # best move from the previous iteration goes first
+        minimax.order_tt_move(moves, first_move)
+    leaves = None
+    if batch and depth + 1 == max_depth:
+        # the children are all leaves, so score them in one pass
+        leaves = leaf_values(player, env, moves, minimax.WEIGHTS)
+    for i, move in enumerate(moves):
+        if leaves is not None:
+            num_states[0] += 1
+            value2 = leaves[i]
+        else:
+            undo = env.make_move(move)
+            # find the move that the min player would pick
+            value2, move2 =  MinValue(-player, env, alpha, beta, depth + 1, max_depth, num_states, tt, batch, ordering)
+            if depth == 0 and value2 == alpha and alpha != float('-inf'):
+                # at the root a value equal to alpha may only be a bound, so search
+                # it again with a full window before letting it win the tie
+                value2, move2 =  MinValue(-player, env, float('-inf'), float('inf'), depth + 1, max_depth, num_states, tt, batch, ordering)
+            env.unmake_move(undo)
+        # if its better than the best so far, save it
+        if value2 >= value:
+            value = value2
+            best_move = move
+            alpha = max(alpha, value)
+        # if pruning, prune what you can
+        if value >= beta:
+            # count the sibling subtrees that never get searched
+            num_states[1] += len(moves) - i - 1
+            if ordering is not None:
+                ordering.record_cutoff(move, depth, max_depth - depth)
+            break
+
+    if tt is not None:
+        if value <= alpha_orig:
+            flag = UPPER
+        elif value >= beta_orig:
+            flag = LOWER
+        else:
+            flag = EXACT
+        tt.store(key, max_depth - depth, flag, value, best_move)
+    return value, best_move
+
+def MinValue(player, env, alpha, beta, depth, max_depth, num_states, tt=None, batch=False, ordering=None):
+    num_states[0] += 1
+    if env.get_num_empty() == 0:
+        return final_value(-player, env), None
+    if depth >= max_depth: # evaluate node with utility function if maxdepth reached
+        return minimax.heuristic(-player, env), None
+    alpha_orig, beta_orig = alpha, beta
+    entry = None
+    if tt is not None:
+        key = env.get_hash()
+        entry, usable = minimax.probe_tt(tt, key, depth, max_depth)
+        if usable:
+            # the table holds the min player's point of view, so negate it
+            _, flag, tt_value, tt_move = entry
+            if flag == EXACT:
+                return -tt_value, tt_move
+            elif flag == LOWER:
+                beta = min(beta, -tt_value)
+            elif flag == UPPER:
+                alpha = max(alpha, -tt_value)
+            if alpha >= beta:
+                return -tt_value, tt_move
+    moves = env.get_moves()
+    value = float('inf')
+    best_move = None
+    if not moves:
+        if not env.has_moves(-player):
+            return final_value(-player, env), None
+        undo = env.make_move(None)
+        value, move2 = MaxValue(-player, env, alpha, beta, depth+1, max_depth, num_states, tt, batch, ordering)
+        env.unmake_move(undo)
+        return value, None
+    if ordering is not None:
+        ordering.order(moves, depth)
+    if entry:
+        minimax.order_tt_move(moves, entry[3])
+    leaves = None
+    if batch and depth + 1 == max_depth:
+        leaves = leaf_values(-player, env, moves, minimax.WEIGHTS)
+    for i, move in enumerate(moves):
+        if leaves is not None:
+            num_states[0] += 1
+            value2 = leaves[i]
+        else:
+            undo = env.make_move(move)
+            # find the move that max player would choose
+            value2, move2 =  MaxValue(-player, env, alpha, beta, depth + 1, max_depth, num_states, tt, batch, ordering)
+            env.unmake_move(undo)
+        # if the move is lower than what has been found, save it
+        if value2 < value:
+            value = value2
+            best_move = move
+            beta = min(beta, value)
+        # if pruning, prune
+        if value <= alpha:
+            num_states[1] += len(moves) - i - 1
+            if ordering is not None:
+                ordering.record_cutoff(move, depth, max_depth - depth)
+            break
+
+    if tt is not None:
+        if value <= alpha_orig:
+            flag = LOWER
+        elif value >= beta_orig:
+            flag = UPPER
+        else:
+            flag = EXACT
+        tt.store(key, max_depth - depth, flag, -value, best_move)
+    return value, best_move
+
+
+def bench_move_generation(cls, games):
+    num_moves = 0
+    start = time.time()
+    for game in games:
+        env = cls()
+        for move in game:
+            moves = env.get_moves()
+            if moves:
+                num_moves += len(moves)
+            env.make_move(move)
+    end = time.time()
+    return num_moves, end - start
+
+def endgame_positions(num_positions, empties, seed=0):
+    # fixed positions reached by random play, with the given number of empty squares
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < num_positions:
+        env = BitboardOthello()
+        while (~(env.black_bits | env.white_bits) & FULL).bit_count() > empties and not env.terminal():
+            moves = env.get_moves()
+            env.make_move(rng.choice(moves) if moves else None)
+        if not env.terminal():
+            positions.append(env)
+    return positions
+
+def bench_endgame(positions):
+    total_nodes = 0
+    start = time.time()
+    for env in positions:
+        start2 = time.time()
+        score, move, nodes = solve_endgame(env)
+        end2 = time.time()
+        total_nodes += nodes
+        print(f'  score: {score:+d}; move: {move}; nodes: {nodes:,d}; seconds: {end2 - start2:,.2f}')
+    end = time.time()
+    return total_nodes, end - start
+
+def random_positions(num_games, seed=0, cls=Othello):
+    # every position from a set of random games
+    positions = []
+    for game in random_games(num_games, seed):
+        env = cls()
+        for move in game:
+            positions.append(copy.deepcopy(env))
+            env.make_move(move)
+    return positions
+
+def make_all_moves(env, moves=None):
+    for move in moves or env.get_moves() or [None]:
+        env.unmake_move(env.make_move(move))
+
+def time_per_position(func, positions):
+    start = time.time()
+    for env in positions:
+        func(env)
+    end = time.time()
+    return len(positions) / (end - start)
+
+@contextlib.contextmanager
+def no_eval_cache():
+    # leaf scores cached by one configuration would speed up the next, so
+    # timed searches run with the cache off
+    cache, minimax.EVAL_CACHE = minimax.EVAL_CACHE, None
+    try:
+        yield
+    finally:
+        minimax.EVAL_CACHE = cache
+
+def run_movegen():
+    # tests/test_bitboard.py and tests/test_unmake.py check the boards agree
+    games = random_games(20)
+    for cls in [Othello, BitboardOthello]:
+        num_moves, elapsed = bench_move_generation(cls, games)
+        print(f'{cls.__name__}: {num_moves:,d} moves generated in {elapsed:,.2f} seconds; {num_moves / elapsed:,.0f} moves/sec')
+
+def run_rays():
+    # tests/test_rays.py checks the moves and frontier masks
+    rates = {}
+    for cls in [ScanOthello, Othello]:
+        positions = random_positions(10, cls=cls)
+        rates[cls, 'get_moves'] = time_per_position(lambda env: env.get_moves(), positions)
+        # make and unmake every move in each position, with the moves generated up front
+        moves = {id(env): env.get_moves() for env in positions}
+        rates[cls, 'make_move'] = time_per_position(lambda env: make_all_moves(env, moves[id(env)]), positions)
+    for name in ['get_moves', 'make_move']:
+        old = rates[ScanOthello, name]
+        new = rates[Othello, name]
+        print(f'{name}: scanning {old:,.0f} positions/sec; ray tables {new:,.0f} positions/sec; {new / old:,.1f}x')
+
+def run_endgame():
+    for empties in [8, 10, 12]:
+        print(f'endgame, {empties} empties:')
+        nodes, elapsed = bench_endgame(endgame_positions(5, empties))
+        print(f'{empties} empties: {nodes:,d} nodes in {elapsed:,.2f} seconds; {nodes / elapsed:,.0f} nodes/sec')
+
+def run_stability():
+    # tests/test_stability.py checks the counts against the reference
+    positions = random_positions(30)
+    old = time_per_position(lambda env: minimax.stability_recursive(env.turn, env, 0, 0), positions)
+    new = time_per_position(lambda env: minimax.stability(env.turn, env, 0, 0), positions)
+    print(f'stability: recursive {old:,.0f} positions/sec; bitboard {new:,.0f} positions/sec; {new / old:,.1f}x')
+    evals = time_per_position(lambda env: minimax.heuristic(env.turn, env), positions)
+    print(f'heuristic: {evals:,.0f} leaf evals/sec')
+
+def run_batch():
+    # tests/test_batch.py checks the batch scores match the single ones
+    positions = random_positions(30)
+    boards = np.array([env.board for env in positions])
+    players = np.array([env.turn for env in positions])
+    single = time_per_position(lambda env: minimax.heuristic(env.turn, env), positions)
+    start = time.time()
+    heuristic_batch(players, boards)
+    end = time.time()
+    print(f'heuristic: one at a time {single:,.0f} positions/sec; batch of {len(positions):,d} {len(positions) / (end - start):,.0f} positions/sec')
+    # the last ply of a search scored in one pass against one leaf at a time,
+    # by the number of children; minimax.BATCH_LEAVES follows from these
+    times = {}
+    with no_eval_cache():
+        for env in positions:
+            moves = env.get_moves()
+            if not moves:
+                continue
+            start = time.perf_counter()
+            leaf_values(env.turn, env, moves)
+            batch = time.perf_counter() - start
+            start = time.perf_counter()
+            for move in moves:
+                undo = env.make_move(move)
+                minimax.evaluate(env.turn, env)
+                env.unmake_move(undo)
+            single = time.perf_counter() - start
+            times.setdefault(min(len(moves) // 4 * 4, 16), []).append((batch, single))
+    for n, runs in sorted(times.items()):
+        batch = 1e6 * sum(b for b, _ in runs) / len(runs)
+        single = 1e6 * sum(s for _, s in runs) / len(runs)
+        print(f'leaves: {n}{"+" if n == 16 else f"-{n + 3}"} children: batch {batch:,.0f} us; one at a time {single:,.0f} us')
+    # and whole searches, where single leaves are also cut by alpha-beta
+    positions = [env for env in random_positions(4, seed=1)[16:40:6] if env.get_moves()]
+    for cls in (Othello, BitboardOthello):
+        envs = [env if cls is Othello else BitboardOthello.from_othello(env) for env in positions]
+        for batch in (False, True):
+            start = time.perf_counter()
+            with no_eval_cache():
+                for env in envs:
+                    minimax.Search(TranspositionTable(8), MoveOrdering(), batch=batch).run(env, 4)
+            print(f'search: depth 4, {cls.__name__}, {"batch" if batch else "single"} leaves: {time.perf_counter() - start:,.2f} seconds')
+
+def run_parallel():
+    # midgame positions, searched at depth 4 with 1/2/4/8 workers
+    positions = [env for env in random_positions(4, seed=1)[16:40:6] if env.get_moves()]
+    print(f'parallel: {len(positions)} positions at depth 4 on {os.cpu_count()} cpus')
+    base = None
+    for workers in [1, 2, 4, 8]:
+        with ParallelSearch(workers) as search:
+            start = time.time()
+            moves = [search.get_move(env, 4, batch=True) for env in positions]
+            elapsed = time.time() - start
+        assert moves == [minimax.get_computer_move(env, 4, endgame_empties=0, batch=True) for env in positions]
+        base = base or elapsed
+        print(f'{workers} workers: {elapsed:,.2f} seconds; speedup: {base / elapsed:,.2f}x')
+
+def run_ordering():
+    # nodes searched at depth 4 in scan order and with each ordering layer
+    positions = [env for env in random_positions(4, seed=1)[16:40:6] if env.get_moves()]
+    configs = [
+        ('scan order', None),
+        ('static squares', MoveOrdering(killers=False, history=False)),
+        ('static + killers', MoveOrdering(history=False)),
+        ('static + killers + history', MoveOrdering()),
+    ]
+    values = None
+    for name, ordering in configs:
+        total_states = total_cutoffs = first_cutoffs = 0
+        results = []
+        with no_eval_cache():
+            start = time.time()
+            for env in positions:
+                if ordering is not None:
+                    ordering.new_search()
+                search = minimax.Search(ordering=ordering, batch=True)
+                value, pv = search.run(env, 4)
+                results.append(value)
+                total_states += search.stats.nodes
+                total_cutoffs += search.stats.cutoffs
+                first_cutoffs += search.stats.cutoffs_by_index[0]
+            elapsed = time.time() - start
+        # move order changes which subtrees get cut, never the value
+        values = values or results
+        assert results == values
+        print(f'{name}: {total_states:,d} states examined; {total_cutoffs:,d} cutoffs, {first_cutoffs / total_cutoffs:.1%} on the first move; {elapsed:,.2f} seconds')
+
+def run_negamax():
+    # the old MaxValue/MinValue pair against negamax with pvs at the same depth,
+    # in scan order and with move ordering plus a transposition table
+    positions = [env for env in random_positions(4, seed=1)[8:50:5] if env.get_moves()]
+    configs = [
+        ('scan order', lambda: None, lambda: None),
+        ('ordering + tt', MoveOrdering, lambda: TranspositionTable(8)),
+    ]
+    for name, make_ordering, make_tt in configs:
+        old_states = new_states = 0
+        old_time = new_time = 0
+        # MaxValue never uses the eval cache, so neither may negamax
+        with no_eval_cache():
+            for env in positions:
+                num_states = [0, 0]
+                start = time.time()
+                old_value, move = MaxValue(env.turn, env, float('-inf'), float('inf'), 0, 4, num_states, make_tt(), batch=True, ordering=make_ordering())
+                old_time += time.time() - start
+                search = minimax.Search(make_tt(), make_ordering(), batch=True)
+                start = time.time()
+                new_value, pv = search.run(env, 4)
+                new_time += time.time() - start
+                assert new_value == old_value
+                old_states += num_states[0]
+                new_states += search.stats.nodes
+        print(f'{name}: minimax {old_states:,d} states in {old_time:,.2f} seconds; negamax {new_states:,d} states in {new_time:,.2f} seconds; same values')
+
+def book_positions(plies):
+    # every position up to plies moves in, symmetric ones included
+    positions = []
+    def expand(env, ply):
+        positions.append(copy.deepcopy(env))
+        if ply < plies and not env.terminal():
+            for move in env.get_moves() or [None]:
+                undo = env.make_move(move)
+                expand(env, ply + 1)
+                env.unmake_move(undo)
+    expand(Othello(), 0)
+    return positions
+
+def run_book():
+    # a small book: every position up to 4 plies must be found, in any of its symmetries
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'book.bin')
+        start = time.time()
+        records = build_book(4, 3, verbose=False)
+        write_book(path, records)
+        print(f'book: {len(records):,d} positions built in {time.time() - start:,.2f} seconds; {os.path.getsize(path):,d} bytes')
+        positions = book_positions(4)
+        with OpeningBook(path) as book:
+            for env in positions:
+                entry = book.probe(env)
+                assert entry is not None and entry[0] in env.get_moves()
+            print(f'book: {book.stats()} over {len(positions):,d} positions')
+            probes = time_per_position(book.probe, positions)
+            searches = time_per_position(lambda env: minimax.get_computer_move(copy.deepcopy(env), 3, batch=True), positions[:20])
+        print(f'book: {1e6 / probes:,.1f} microseconds per lookup; {1e6 / searches:,.0f} microseconds per depth 3 search')
+
+def run_symmetry():
+    # tests/test_symmetry.py checks the transforms
+    positions = random_positions(5)
+    black = np.array([get_env_bits(env, env.black)[0] for env in positions], dtype=np.uint64)
+    white = np.array([get_env_bits(env, env.black)[1] for env in positions], dtype=np.uint64)
+    single = time_per_position(lambda env: env.get_canonical_hash(), positions)
+    start = time.time()
+    canonical_bits_batch(black, white)
+    batch = len(positions) / (time.time() - start)
+    print(f'symmetry: canonical hash {single:,.0f} positions/sec; batch canonical form {batch:,.0f} positions/sec')
+    # one tt kept across every opening position, as in a game or a book build
+    positions = book_positions(4)
+    for symmetric in [False, True]:
+        tt = TranspositionTable(16)
+        total_states = 0
+        start = time.time()
+        with no_eval_cache():
+            for env in positions:
+                search = minimax.Search(tt, MoveOrdering(), batch=True, symmetric=symmetric)
+                search.run(env, 4)
+                total_states += search.stats.nodes
+        name = 'canonical keys' if symmetric else 'plain keys'
+        print(f'{name}: {total_states:,d} states examined over {len(positions):,d} opening positions; {time.time() - start:,.2f} seconds')
+
+def wait_for_move(engine):
+    start = time.time()
+    while True:
+        done, move = engine.poll()
+        if done:
+            return move, time.time() - start
+        time.sleep(0.001)
+
+def run_engine():
+    # an engine game against a player who thinks for a while and then plays
+    # either the reply the engine expected or a random move
+    options = dict(max_depth=5, batch=True)
+    think_time = 2
+    fresh = []
+    pondered = []
+    with Engine(16) as engine:
+        env = Othello()
+        rng = random.Random(0)
+        ponder_move = None
+        while not env.terminal() and np.count_nonzero(env.board == 0) > 20:
+            env.get_moves()
+            hits = engine.ponder_hits
+            engine.request(env, **options)
+            move, elapsed = wait_for_move(engine)
+            (pondered if engine.ponder_hits > hits else fresh).append(elapsed)
+            env.make_move(move)
+            moves = env.get_moves()
+            ponder_move = engine.ponder(env, **options)
+            time.sleep(think_time)
+            if ponder_move is None or rng.random() < 0.5:
+                ponder_move = rng.choice(moves) if moves else None
+            env.make_move(ponder_move)
+        hits, misses = engine.ponder_hits, engine.ponder_misses
+        # cancelling a deep search
+        env.get_moves()
+        engine.request(env, max_depth=9, batch=True)
+        time.sleep(0.5)
+        start = time.time()
+        engine.cancel()
+        cancel = time.time() - start
+    print(f'engine: fresh search {1000 * sum(fresh) / len(fresh):,.0f} ms per move over {len(fresh)} moves; '
+          f'after a ponder hit {1000 * sum(pondered) / max(1, len(pondered)):,.0f} ms over {len(pondered)} moves')
+    print(f'engine: ponder hits: {hits:,d}; misses: {misses:,d}; cancelling a depth 9 search took {1000 * cancel:,.1f} ms')
+
+def run_patterns():
+    # random weights are enough to check the evaluator and time it
+    rng = np.random.default_rng(0)
+    evaluator = PatternEvaluator(rng.normal(size=(NUM_PHASES, TABLE_SIZE + 1)).astype(np.float32))
+    positions = random_positions(10)
+    for env in positions[::7]:
+        score = evaluator.evaluate(env.turn, env)
+        # the same table entries, added up in a different order
+        assert all(np.isclose(evaluator.evaluate(env.turn, transform_env(env, t)), score) for t in range(8))
+    # the batch leaves must score each child the way the single leaves do, so
+    # both searches agree
+    minimax.EVALUATOR = evaluator
+    try:
+        with no_eval_cache():
+            for env in [env for env in random_positions(4, seed=1)[8:50:5] if env.get_moves()]:
+                single = minimax.Search(batch=False).run(env, 3)
+                batch = minimax.Search(batch=True).run(env, 3)
+                assert np.isclose(single[0], batch[0]) and single[1][0] == batch[1][0], (single, batch)
+    finally:
+        minimax.EVALUATOR = None
+    print('patterns: scores match over all 8 symmetries; batch and single leaf searches agree')
+    old = time_per_position(lambda env: minimax.heuristic(env.turn, env), positions)
+    new = time_per_position(lambda env: evaluator.evaluate(env.turn, env), positions)
+    print(f'one at a time: heuristic {old:,.0f} positions/sec; patterns {new:,.0f} positions/sec')
+    black = np.array([get_env_bits(env, env.black)[0] for env in positions], dtype=np.uint64)
+    white = np.array([get_env_bits(env, env.black)[1] for env in positions], dtype=np.uint64)
+    players = np.array([env.turn for env in positions])
+    for name, func in [('heuristic', heuristic_batch), ('patterns', evaluator.evaluate_batch)]:
+        start = time.time()
+        func(players, black, white)
+        print(f'batch of {len(positions):,d}: {name} {len(positions) / (time.time() - start):,.0f} positions/sec')
+    positions = [env for env in random_positions(4, seed=1)[16:40:6] if env.get_moves()]
+    for name, patterns in [('heuristic', None), ('patterns', evaluator)]:
+        minimax.EVALUATOR = patterns
+        states = 0
+        start = time.time()
+        with no_eval_cache():
+            for env in positions:
+                search = minimax.Search(TranspositionTable(8), MoveOrdering(), batch=True)
+                search.run(env, 4)
+                states += search.stats.nodes
+        elapsed = time.time() - start
+        print(f'depth 4 search with {name}: {states:,d} states; {states / elapsed:,.0f} states/sec')
+    minimax.EVALUATOR = None
+
+class CutoffCounter(SearchHooks):
+    def __init__(self):
+        self.cutoffs = 0
+
+    def on_cutoff(self, ply, index, move):
+        self.cutoffs += 1
+
+def run_stats():
+    # the same searches with the default counters, with profiling, and with
+    # hooks, which must find the same moves; the exporter writes one line per search
+    positions = [env for env in random_positions(4, seed=1)[16:40:6] if env.get_moves()]
+    moves = None
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'stats.jsonl')
+        for name, options in [('counters only', {}), ('profiled', dict(profile=True)), ('hooks', dict(hooks=CutoffCounter()))]:
+            results = []
+            nodes = 0
+            start = time.time()
+            with no_eval_cache():
+                for env in positions:
+                    move, stats = minimax.find_move(env, 4, tt=TranspositionTable(8), ordering=MoveOrdering(), batch=True, endgame_empties=0, **options)
+                    assert stats.nodes == sum(stats.nodes_by_ply) and stats.move == move == stats.pv[0]
+                    results.append(move)
+                    nodes += stats.nodes
+            elapsed = time.time() - start
+            moves = moves or results
+            assert results == moves
+            extra = ''
+            if 'profile' in options:
+                extra = '; ' + ', '.join(f'{key} {seconds:,.3f}' for key, seconds in stats.times.items()) + ' seconds in the last search'
+            if 'hooks' in options:
+                assert options['hooks'].cutoffs >= stats.cutoffs
+            print(f'stats: {name}: {nodes:,d} states; {nodes / elapsed:,.0f} states/sec{extra}')
+        with JsonLinesExporter(path) as exporter:
+            for env in positions:
+                minimax.find_move(env, 3, time_limit=10, endgame_empties=0, hooks=exporter)
+        with open(path) as f:
+            records = [json.loads(line) for line in f]
+    assert len(records) == len(positions) and all(r['nodes'] == sum(r['nodes_by_ply']) for r in records)
+    print(f'stats: {len(records)} json lines exported; first record: depth {records[0]["depth"]}, {records[0]["nodes"]:,d} nodes, '
+          f'cutoffs by move index {records[0]["cutoffs_by_index"]}')
+
+def run_records():
+    # random games, which pass often, through transcripts and a position
+    # database and back; tests/test_records.py checks nothing is lost
+    games = random_games(2000)
+    with_passes = sum(None in moves for moves in games)
+    start = time.time()
+    transcripts = [write_transcript(moves) for moves in games]
+    [read_transcript(t) for t in transcripts]
+    print(f'records: {len(games):,d} transcripts ({with_passes:,d} with passes) written and read back in {time.time() - start:,.2f} seconds')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'positions.db')
+        start = time.time()
+        count = write_database(path, games)
+        write = count / (time.time() - start)
+        with PositionDatabase(path) as db:
+            start = time.time()
+            batches = sum(len(batch) for batch in db.batches(4096))
+            read = batches / (time.time() - start)
+            start = time.time()
+            scored = 0
+            for env in db.envs():
+                minimax.heuristic(env.turn, env)
+                scored += 1
+                if scored == 2000:
+                    break
+            rescore = scored / (time.time() - start)
+        size = os.path.getsize(path)
+    print(f'records: {count:,d} positions, {size / count:,.0f} bytes each; written {write:,.0f}/sec; read {read:,.0f}/sec; '
+          f'streamed and rescored with heuristic {rescore:,.0f}/sec')
+
+def self_play(seed, depth, batch):
+    # a full game of the search against itself after a few random moves;
+    # returns the moves and the seconds spent evaluating leaves
+    rng = random.Random(seed)
+    env = BitboardOthello()
+    moves = []
+    eval_time = 0
+    while not env.terminal():
+        legal = env.get_moves()
+        if len(moves) < 4 and legal:
+            move = rng.choice(legal)
+        else:
+            move, stats = minimax.find_move(env, depth, tt=TranspositionTable(8), ordering=MoveOrdering(), batch=batch,
+                                            endgame_empties=0, profile=True)
+            eval_time += stats.times['eval']
+        env.make_move(move)
+        moves.append(move)
+    return moves, eval_time
+
+def run_evalcache():
+    # the same self-play games with the cache off and on, with single and batch
+    # leaf scoring; the cache keeps its entries from move to move of a game
+    cache = minimax.EVAL_CACHE
+    seeds = range(2)
+    for batch in [False, True]:
+        results = {}
+        for name, config in [('no cache', None), ('cache', cache)]:
+            minimax.EVAL_CACHE = config
+            if config is not None:
+                config.clear()
+            start = time.time()
+            games = [self_play(seed, 3, batch) for seed in seeds]
+            elapsed = time.time() - start
+            results[name] = [moves for moves, _ in games]
+            eval_time = sum(t for _, t in games)
+            stats = f'; {config.stats()}' if config is not None else ''
+            print(f'evalcache: {"batch" if batch else "single"} leaves, {name}: {len(games)} games in {elapsed:,.2f} seconds; '
+                  f'{eval_time:,.2f} seconds evaluating{stats}')
+        assert results['no cache'] == results['cache']
+    minimax.EVAL_CACHE = cache
+
+async def serve_load_test(workers, sessions, positions, depth):
+    # a fresh server on a free port for each run, so no run starts with a warm tt
+    async with EngineServer(workers, 16) as server:
+        tcp = await asyncio.start_server(server.handle, '127.0.0.1', 0)
+        async with tcp:
+            port = tcp.sockets[0].getsockname()[1]
+            return await load_test('127.0.0.1', port, positions, sessions, depth)
+
+def run_position():
+    # tests/test_position.py checks positions follow the boards and round trip
+    positions = []
+    for moves in random_games(300):
+        position = Position()
+        for move in moves:
+            positions.append(position)
+            position = position.play(move)
+
+    env = Othello()
+    position = Position.from_env(env)
+    reps = 20000
+    for name, func in (('copy.deepcopy(Othello())', lambda: copy.deepcopy(env)), ('Position.clone()', position.clone),
+                       ('Position.from_env(Othello())', lambda: Position.from_env(env)),
+                       ('Position.to_env()', position.to_env), ('Othello.get_hash()', env.get_hash),
+                       ('hash(Position)', lambda: hash(position))):
+        start = time.perf_counter()
+        for _ in range(reps):
+            func()
+        print(f'position: {name}: {1e6 * (time.perf_counter() - start) / reps:,.2f} us')
+    envs = [p.to_env() for p in positions[:2000]]
+    for name, items in (('Othello', envs), ('Position', positions[:2000])):
+        start = time.perf_counter()
+        data = pickle.dumps(items)
+        pickle.loads(data)
+        elapsed = time.perf_counter() - start
+        print(f'position: pickled {len(items):,d} {name}: {len(data) / len(items):,.0f} bytes each; '
+              f'dumps and loads {1e6 * elapsed / len(items):,.2f} us each')
+    print(f'position: to_bytes {len(position.to_bytes())} bytes')
+
+def scan_winner(env):
+    # the winner check as it was: the pass flags, then numpy scans of the
+    # board for the empty squares and for each player's discs
+    full = np.where(env.board == 0)[0].size == 0
+    if not (env.blackpass and env.whitepass or full):
+        return 0
+    num_black = np.where(env.board == env.black)[0].size
+    num_white = np.where(env.board == env.white)[0].size
+    return np.sign(num_black - num_white)
+
+def run_counts():
+    # tests/test_counts.py checks the kept counts and terminal against the board
+    positions = random_positions(4, seed=1)[8:50:5]
+    reps = 20000
+    for name, func in (('old scan winner check', scan_winner), ('get_num_empty()', lambda env: env.get_num_empty()),
+                       ('coin_parity', lambda env: minimax.coin_parity(env.turn, env))):
+        start = time.perf_counter()
+        for _ in range(reps):
+            func(positions[0])
+        print(f'counts: {name}: {1e6 * (time.perf_counter() - start) / reps:,.2f} us')
+    # the old pair checked the winner twice a node; negamax now checks the
+    # kept empty count once, and both players' moves only when there are none
+    for cls in (Othello, BitboardOthello):
+        envs = [env if cls is Othello else BitboardOthello.from_othello(env) for env in positions]
+        for batch in (False, True):
+            nodes = 0
+            start = time.perf_counter()
+            with no_eval_cache():
+                for env in envs:
+                    search = minimax.Search(batch=batch)
+                    search.run(env, 4)
+                    nodes += search.stats.nodes
+            elapsed = time.perf_counter() - start
+            print(f'counts: negamax depth 4, {cls.__name__}, {"batch" if batch else "single"} leaves: {nodes:,d} states; '
+                  f'{1e6 * elapsed / nodes:,.1f} us per state')
+
+def run_perft():
+    # both boards against the published counts, and the undo records must
+    # leave the start position as it was
+    for cls, depth in ((Othello, 7), (BitboardOthello, 8)):
+        start = time.time()
+        check_perft(cls, depth)
+        env = cls()
+        perft(env, depth - 2)
+        assert same_position(env, cls())
+        elapsed = time.time() - start
+        nodes = sum(PERFT_COUNTS[:depth + 1])
+        print(f'perft: {cls.__name__} correct to depth {depth}; {nodes:,d} leaves in {elapsed:,.2f} seconds; {nodes / elapsed:,.0f} leaves/sec')
+
+def list_mobility(max_player, env):
+    # mobility as it was: a copy of the turn and pass flags, and a move list
+    # for each side only to take its length
+    turn, blackpass, whitepass = env.turn, env.blackpass, env.whitepass
+    env.turn = max_player
+    max_moves = env.get_moves() or []
+    env.turn = -max_player
+    min_moves = env.get_moves() or []
+    env.turn, env.blackpass, env.whitepass = turn, blackpass, whitepass
+    if not max_moves and not min_moves:
+        return 0
+    return 100 * (len(max_moves) - len(min_moves)) / (len(max_moves) + len(min_moves))
+
+def run_mobility():
+    # tests/test_mobility.py checks the counts against move lists and board scans
+    positions = random_positions(30)
+    weights, minimax.WEIGHTS = minimax.WEIGHTS, minimax.WEIGHTS[:5] + (40,)
+    try:
+        with_potential = time_per_position(lambda env: minimax.heuristic(env.turn, env), positions)
+    finally:
+        minimax.WEIGHTS = weights
+
+    for cls in (Othello, BitboardOthello):
+        envs = positions if cls is Othello else [BitboardOthello.from_othello(env) for env in positions]
+        old = time_per_position(lambda env: list_mobility(env.turn, env), envs)
+        new = time_per_position(lambda env: minimax.mobility(env.turn, env), envs)
+        potential = time_per_position(lambda env: minimax.potential_mobility(env.turn, env), envs)
+        print(f'mobility: {cls.__name__}: move lists {old:,.0f} positions/sec; move counts {new:,.0f} positions/sec; '
+              f'{new / old:,.1f}x; potential mobility {potential:,.0f} positions/sec')
+    mobility, minimax.mobility = minimax.mobility, list_mobility
+    try:
+        old = time_per_position(lambda env: minimax.heuristic(env.turn, env), positions)
+    finally:
+        minimax.mobility = mobility
+    new = time_per_position(lambda env: minimax.heuristic(env.turn, env), positions)
+    print(f'mobility: heuristic leaf evals with move lists {old:,.0f}/sec; with move counts {new:,.0f}/sec; '
+          f'{new / old:,.2f}x; with potential mobility weighted in {with_potential:,.0f}/sec')
+
+def run_server():
+    # every session asks for the same positions in its own order; searches
+    # for a position already queued or running are shared
+    positions = make_positions(12)
+    for workers, sessions in [(1, 1), (1, 4), (2, 4), (2, 16)]:
+        results = asyncio.run(serve_load_test(workers, sessions, positions, 3))
+        assert results['errors'] == 0 and results['requests'] == sessions * len(positions)
+        print(f'server: {workers} workers, {format_results(results)}')
+
+BENCHMARKS = {
+    'movegen': run_movegen,
+    'rays': run_rays,
+    'endgame': run_endgame,
+    'stability': run_stability,
+    'batch': run_batch,
+    'parallel': run_parallel,
+    'ordering': run_ordering,
+    'negamax': run_negamax,
+    'book': run_book,
+    'symmetry': run_symmetry,
+    'engine': run_engine,
+    'patterns': run_patterns,
+    'stats': run_stats,
+    'records': run_records,
+    'evalcache': run_evalcache,
+    'server': run_server,
+    'position': run_position,
+    'counts': run_counts,
+    'perft': run_perft,
+    'mobility': run_mobility,
+}
+
+def main():
+    # run the benchmarks named on the command line, or all of them
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
+
+if __name__ == '__main__':
+    main()
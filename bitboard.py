@@ -0,0 +1,321 @@
+import numpy as np
+from othello import Othello, ZOBRIST, ZOBRIST_TURN, ZOBRIST_BLACKPASS, ZOBRIST_WHITEPASS, bits_hash
+from symmetry import canonical_bits
+from movegen import FULL, LEFT_DIRS, RIGHT_DIRS, get_moves_bb, get_potential_moves_bb
+
+# each line axis as (shift, mask towards higher bits, mask towards lower bits),
+# with the squares at either end of its lines (no neighbour below / above)
+LINE_AXES = tuple(
+    (shift, up, down, ~((FULL << shift) & up) & FULL, ~((FULL >> shift) & down) & FULL)
+    for (shift, up), (_, down) in zip(LEFT_DIRS, RIGHT_DIRS)
+)
+
+# flipping a disc swaps its black key for its white key
+ZOBRIST_FLIP = [ZOBRIST[1][sq] ^ ZOBRIST[-1][sq] for sq in range(64)]
+
+
+def square(x, y):
+    return 8 * y + x
+
+def square_to_move(sq):
+    return (sq & 7, sq >> 3)
+
+def iter_squares(bits):
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+def get_flips_bb(p, o, sq):
+    bit = 1 << sq
+    flips = 0
+    for shift, mask in LEFT_DIRS:
+        f = 0
+        m = (bit << shift) & mask
+        while m & o:
+            f |= m
+            m = (m << shift) & mask
+        if m & p:
+            flips |= f
+    for shift, mask in RIGHT_DIRS:
+        f = 0
+        m = (bit >> shift) & mask
+        while m & o:
+            f |= m
+            m = (m >> shift) & mask
+        if m & p:
+            flips |= f
+    return flips
+
+def get_stability_bb(p, o):
+    # a disc is protected along a line if the filled run through it reaches
+    # an edge, or has opposing discs on both sides; it is takeable if only one
+    # side has an opposing disc. stable discs are protected along all four lines,
+    # danger discs are takeable along some line
+    occ = p | o
+    stable_p, stable_o = p, o
+    danger_p = danger_o = 0
+    for shift, up, down, edge_lo, edge_hi in LINE_AXES:
+        # squares joined to an edge by a run of filled squares
+        lo = occ & edge_lo
+        hi = occ & edge_hi
+        for _ in range(7):
+            lo |= occ & (lo << shift) & up
+            hi |= occ & (hi >> shift) & down
+        anchored = lo | hi
+        for color, opp, side in ((p, o, 0), (o, p, 1)):
+            # discs that reach an opposing disc before an empty square
+            opp_lo = (opp << shift) & up
+            opp_hi = (opp >> shift) & down
+            for _ in range(6):
+                opp_lo |= ((opp_lo & color) << shift) & up
+                opp_hi |= ((opp_hi & color) >> shift) & down
+            protected = (anchored | (opp_lo & opp_hi)) & color
+            takeable = (opp_lo | opp_hi) & color & ~protected
+            if side == 0:
+                stable_p &= protected
+                danger_p |= takeable
+            else:
+                stable_o &= protected
+                danger_o |= takeable
+    danger_p &= ~stable_p
+    danger_o &= ~stable_o
+    unprot_p = p & ~stable_p & ~danger_p
+    unprot_o = o & ~stable_o & ~danger_o
+    return (stable_p.bit_count(), stable_o.bit_count(), danger_p.bit_count(),
+            danger_o.bit_count(), unprot_p.bit_count(), unprot_o.bit_count())
+
+def get_env_bits(env, player=None):
+    # (player, opponent) bitboards for either board type, player defaults to the side to move
+    if player is None:
+        player = env.turn
+    if hasattr(env, 'black_bits'):
+        if player == env.black:
+            return env.black_bits, env.white_bits
+        return env.white_bits, env.black_bits
+    return env.bits[player], env.bits[-player]
+
+def board_to_bits(board, piece):
+    # board is indexed board[x, y]; transposing gives bit order 8*y + x
+    flat = np.ascontiguousarray(board.T).ravel() == piece
+    return int.from_bytes(np.packbits(flat, bitorder='little').tobytes(), 'little')
+
+def bits_to_array(bits):
+    arr = np.unpackbits(np.frombuffer(bits.to_bytes(8, 'little'), dtype=np.uint8), bitorder='little')
+    return arr.reshape(8, 8).T
+
+
+class BitboardOthello:
+    def __init__(self):
+        self.black = 1
+        self.white = -1
+        self.black_bits = 0
+        self.white_bits = 0
+        # the array built by board, with the bits it was built from
+        self.board_cache = None
+        self.hash = 0
+        self.add_piece(self.white, 3, 3)
+        self.add_piece(self.white, 4, 4)
+        self.add_piece(self.black, 3, 4)
+        self.add_piece(self.black, 4, 3)
+        self.turn = self.black
+        self.blackpass = False
+        self.whitepass = False
+
+    @classmethod
+    def from_othello(cls, env):
+        new = cls()
+        new.black_bits = env.bits[env.black]
+        new.white_bits = env.bits[env.white]
+        new.hash = env.hash
+        new.turn = env.turn
+        new.blackpass = env.blackpass
+        new.whitepass = env.whitepass
+        return new
+
+    def to_othello(self):
+        env = Othello()
+        board = self.board
+        for x in range(8):
+            for y in range(8):
+                env.add_piece(board[x, y], x, y)
+        env.turn = self.turn
+        env.blackpass = self.blackpass
+        env.whitepass = self.whitepass
+        return env
+
+    @property
+    def board(self):
+        # the heuristic reads board many times a leaf, so the array is only
+        # rebuilt once the bits change, however they were changed; it's
+        # shared, so it's read-only
+        bits = self.black_bits, self.white_bits
+        if self.board_cache is None or self.board_cache[0] != bits:
+            board = bits_to_array(self.black_bits).astype(np.int16)
+            board -= bits_to_array(self.white_bits).astype(np.int16)
+            board.flags.writeable = False
+            self.board_cache = bits, board
+        return self.board_cache[1]
+
+    def get_bits(self):
+        # (player to move, opponent)
+        if self.turn == self.black:
+            return self.black_bits, self.white_bits
+        return self.white_bits, self.black_bits
+
+    def get_moves(self):
+        p, o = self.get_bits()
+        moves = [square_to_move(sq) for sq in iter_squares(get_moves_bb(p, o))]
+        if len(moves) == 0:
+            return None
+        if self.turn == self.black:
+            self.blackpass = False
+        elif self.turn == self.white:
+            self.whitepass = False
+        return moves
+
+    def make_move(self, move):
+        # returns an undo record for unmake_move
+        undo = (self.black_bits, self.white_bits, self.turn, self.blackpass, self.whitepass, self.hash)
+        if not move:
+            self.turn = self.get_opp()
+            if self.turn == self.black:
+                self.blackpass = True
+            elif self.turn == self.white:
+                self.whitepass = True
+            return undo
+        sq = square(move[0], move[1])
+        p, o = self.get_bits()
+        flips = get_flips_bb(p, o, sq)
+        self.hash ^= ZOBRIST[self.turn][sq]
+        for sq2 in iter_squares(flips):
+            self.hash ^= ZOBRIST_FLIP[sq2]
+        p |= flips | (1 << sq)
+        o &= ~p
+        if self.turn == self.black:
+            self.black_bits, self.white_bits = p, o
+        else:
+            self.white_bits, self.black_bits = p, o
+        self.turn = self.get_opp()
+        return undo
+
+    def unmake_move(self, undo):
+        self.black_bits, self.white_bits, self.turn, self.blackpass, self.whitepass, self.hash = undo
+
+    def is_valid(self, x, y):
+        p, o = self.get_bits()
+        return bool(get_moves_bb(p, o) >> square(x, y) & 1)
+
+    def print_board(self):
+        print('+-----------------+')
+        for y in range(8):
+            string = '|'
+            for x in range(8):
+                p = self.get_piece(x, y)
+                if p == 0:
+                    string += '  '
+                elif p == self.black:
+                    string += ' ○'
+                else:
+                    string += ' ●'
+            string += ' |'
+            print(string)
+        print('+-----------------+')
+
+    def has_moves(self, player):
+        # whether player has a legal move, whoever is to move
+        if player == self.black:
+            return get_moves_bb(self.black_bits, self.white_bits) != 0
+        return get_moves_bb(self.white_bits, self.black_bits) != 0
+
+    def count_moves(self, player):
+        # the number of legal moves player has, whoever is to move
+        if player == self.black:
+            return get_moves_bb(self.black_bits, self.white_bits).bit_count()
+        return get_moves_bb(self.white_bits, self.black_bits).bit_count()
+
+    def count_potential_moves(self, player):
+        # potential mobility: the empty squares next to an opponent disc
+        if player == self.black:
+            return get_potential_moves_bb(self.black_bits, self.white_bits).bit_count()
+        return get_potential_moves_bb(self.white_bits, self.black_bits).bit_count()
+
+    def terminal(self):
+        # the game is over once the board is full or neither player can move
+        p, o = self.get_bits()
+        return (p | o) == FULL or not get_moves_bb(p, o) and not get_moves_bb(o, p)
+
+    def add_piece(self, p, x, y):
+        sq = square(x, y)
+        old = self.get_piece(x, y)
+        if old != 0:
+            self.hash ^= ZOBRIST[old][sq]
+        if p != 0:
+            self.hash ^= ZOBRIST[p][sq]
+        bit = 1 << sq
+        self.black_bits &= ~bit
+        self.white_bits &= ~bit
+        if p == self.black:
+            self.black_bits |= bit
+        elif p == self.white:
+            self.white_bits |= bit
+
+    def flip_piece(self, x, y):
+        if self.get_piece(x, y) != 0:
+            self.add_piece(self.get_turn(), x, y)
+
+    def get_hash(self):
+        key = self.hash
+        if self.turn == self.white:
+            key ^= ZOBRIST_TURN
+        if self.blackpass:
+            key ^= ZOBRIST_BLACKPASS
+        if self.whitepass:
+            key ^= ZOBRIST_WHITEPASS
+        return key
+
+    def get_canonical(self):
+        return canonical_bits(self.black_bits, self.white_bits)
+
+    def get_canonical_hash(self):
+        black, white, t = self.get_canonical()
+        return self.get_hash() ^ self.hash ^ bits_hash(black, white), t
+
+    def get_piece(self, x, y):
+        sq = square(x, y)
+        if self.black_bits >> sq & 1:
+            return self.black
+        if self.white_bits >> sq & 1:
+            return self.white
+        return 0
+
+    def get_turn(self):
+        return self.turn
+
+    def get_num_black(self):
+        return self.black_bits.bit_count()
+
+    def get_num_white(self):
+        return self.white_bits.bit_count()
+
+    def get_num_empty(self):
+        return 64 - (self.black_bits | self.white_bits).bit_count()
+
+    def get_leader(self):
+        # the player with more discs, 0 if even; the winner once the game is over
+        num_black = self.black_bits.bit_count()
+        num_white = self.white_bits.bit_count()
+        if num_black > num_white:
+            return self.black
+        elif num_white > num_black:
+            return self.white
+        else:
+            return 0
+
+    def get_winner(self):
+        if not self.terminal():
+            return 0
+        return self.get_leader()
+
+    def get_opp(self):
+        return -self.turn
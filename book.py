@@ -0,0 +1,150 @@
+from bitboard import BitboardOthello, get_env_bits, iter_squares, square, square_to_move
+from othello import ZOBRIST
+from symmetry import canonical_bits, transform_square, INVERSE
+from transposition import TranspositionTable
+from ordering import MoveOrdering
+import minimax
+import argparse
+import mmap
+import struct
+import time
+
+# a book file is a header followed by fixed size records sorted by key, so a
+# lookup is a binary search over the memory-mapped file. keys hash the
+# canonical position (smallest of the 8 symmetries) with the side to move's
+# discs first, and moves are stored as squares of the canonical position
+MAGIC = b'OTHBOOK1'
+HEADER = struct.Struct('<8sI4x') # magic, number of records
+RECORD = struct.Struct('<QiBBxx') # key, value, move square, depth
+INT32_MAX = 2**31 - 1
+
+
+def position_key(p, o):
+    # zobrist hash of the discs of the player to move (p) and the opponent (o)
+    key = 0
+    for sq in iter_squares(p):
+        key ^= ZOBRIST[1][sq]
+    for sq in iter_squares(o):
+        key ^= ZOBRIST[-1][sq]
+    return key
+
+def canonical_key(env):
+    # returns (key, transform from env's board to the canonical one)
+    p, o, t = canonical_bits(*get_env_bits(env))
+    return position_key(p, o), t
+
+
+class OpeningBook:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or HEADER.size + self.size * RECORD.size > len(self.mm):
+            self.close()
+            raise ValueError(f'{path} is not an opening book')
+        self.hits = 0
+        self.misses = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+    def find(self, key):
+        # (value, canonical square, depth) for key, or None
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = HEADER.size + mid * RECORD.size
+            mid_key = struct.unpack_from('<Q', self.mm, offset)[0]
+            if mid_key < key:
+                lo = mid + 1
+            elif mid_key > key:
+                hi = mid
+            else:
+                return RECORD.unpack_from(self.mm, offset)[1:]
+        return None
+
+    def probe(self, env):
+        # (move, value, depth) for the player to move in env, or None
+        key, t = canonical_key(env)
+        entry = self.find(key)
+        if entry is not None:
+            value, sq, depth = entry
+            move = square_to_move(transform_square(sq, INVERSE[t]))
+            # a hash collision could give a move that isn't legal here
+            if env.is_valid(*move):
+                self.hits += 1
+                return move, value, depth
+        self.misses += 1
+        return None
+
+    def stats(self):
+        probes = self.hits + self.misses
+        rate = self.hits / probes if probes else 0
+        return f'book hits: {self.hits:,d}; misses: {self.misses:,d}; hit rate: {rate:.1%}'
+
+def write_book(path, records):
+    # records maps key -> (value, canonical square, depth)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(records)))
+        for key in sorted(records):
+            value, sq, depth = records[key]
+            f.write(RECORD.pack(key, value, sq, depth))
+
+def build_book(plies, depth, tt_size_mb=64, verbose=True):
+    # searches every position up to plies moves from the start, once per
+    # symmetry class, and returns the records for write_book
+    env = BitboardOthello()
+    tt = TranspositionTable(tt_size_mb)
+    ordering = MoveOrdering()
+    records = {}
+    seen = set()
+    start = time.time()
+
+    def expand(ply):
+        key, t = canonical_key(env)
+        if key in seen or env.terminal():
+            return
+        seen.add(key)
+        moves = env.get_moves()
+        if moves:
+            tt.new_search()
+            ordering.new_search()
+            value, pv = minimax.Search(tt, ordering).run(env, depth)
+            value = round(max(-INT32_MAX, min(INT32_MAX, value)))
+            records[key] = (value, transform_square(square(*pv[0]), t), depth)
+            if verbose and len(records) % 100 == 0:
+                print(f'{len(records):,d} positions; seconds elapsed: {time.time() - start:,.1f}')
+        if ply < plies:
+            for move in moves or [None]:
+                undo = env.make_move(move)
+                expand(ply + 1)
+                env.unmake_move(undo)
+
+    expand(0)
+    return records
+
+def main():
+    parser = argparse.ArgumentParser(description='build an opening book')
+    parser.add_argument('--plies', type=int, default=6, help='book every position up to this many moves in')
+    parser.add_argument('--depth', type=int, default=4, help='search depth for each position')
+    parser.add_argument('--out', default='book.bin')
+    args = parser.parse_args()
+
+    start = time.time()
+    records = build_book(args.plies, args.depth)
+    write_book(args.out, records)
+    print(f'{len(records):,d} positions in {time.time() - start:,.1f} seconds; book in {args.out}')
+
+if __name__ == '__main__':
+    main()
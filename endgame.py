@@ -0,0 +1,114 @@
+from bitboard import FULL, get_moves_bb, get_flips_bb, iter_squares, square_to_move, get_env_bits
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+ENDGAME_EMPTIES = 12 # solve exactly once this many squares or fewer are empty
+FASTEST_FIRST_EMPTIES = 7 # order by opponent mobility above this many empties, by parity below
+STOP_CHECK_NODES = 1024 # how often the solver looks at its stop flag and deadline
+
+# the four 4x4 quadrants, used for parity ordering
+QUADRANTS = (0x000000000F0F0F0F, 0x00000000F0F0F0F0, 0x0F0F0F0F00000000, 0xF0F0F0F000000000)
+CORNERS = 0x8100000000000081
+
+
+class SolveStopped(Exception):
+    pass
+
+
+def final_score(p, o):
+    return p.bit_count() - o.bit_count()
+
+def solve_last(p, o, sq):
+    # one empty square left: whoever can move there does, otherwise the game ends
+    flips = get_flips_bb(p, o, sq)
+    if flips:
+        n = flips.bit_count()
+        return p.bit_count() + n + 1 - (o.bit_count() - n)
+    flips = get_flips_bb(o, p, sq)
+    if flips:
+        n = flips.bit_count()
+        return p.bit_count() - n - (o.bit_count() + n + 1)
+    return final_score(p, o)
+
+def order_moves(p, o, moves, empties):
+    if empties.bit_count() > FASTEST_FIRST_EMPTIES:
+        # fastest first: leave the opponent as few replies as possible, corners break ties
+        scored = []
+        for sq in iter_squares(moves):
+            flips = get_flips_bb(p, o, sq)
+            p2 = p | flips | (1 << sq)
+            o2 = o & ~flips
+            scored.append((get_moves_bb(o2, p2).bit_count() - (CORNERS >> sq & 1), sq, flips))
+        scored.sort()
+        return [(sq, flips) for _, sq, flips in scored]
+    # parity: play into regions with an odd number of empties first
+    odd = 0
+    for quadrant in QUADRANTS:
+        if (empties & quadrant).bit_count() & 1:
+            odd |= quadrant
+    ordered = list(iter_squares(moves & odd)) + list(iter_squares(moves & ~odd))
+    return [(sq, get_flips_bb(p, o, sq)) for sq in ordered]
+
+def solve(p, o, alpha, beta, stats, stop=None, deadline=None):
+    # exact negamax score (disc differential for the player to move). stop is
+    # an optional event and deadline an optional time.time(); once the event
+    # is set or the deadline has passed the solve raises SolveStopped
+    stats[0] += 1
+    if (stop is not None or deadline is not None) and stats[0] % STOP_CHECK_NODES == 0 and (
+            stop is not None and stop.is_set() or deadline is not None and time.time() > deadline):
+        raise SolveStopped
+    empties = ~(p | o) & FULL
+    if empties & (empties - 1) == 0:
+        if empties == 0:
+            return final_score(p, o)
+        return solve_last(p, o, empties.bit_length() - 1)
+    moves = get_moves_bb(p, o)
+    if not moves:
+        if not get_moves_bb(o, p):
+            return final_score(p, o)
+        return -solve(o, p, -beta, -alpha, stats, stop, deadline)
+    best = -65
+    for sq, flips in order_moves(p, o, moves, empties):
+        value = -solve(o & ~flips, p | flips | (1 << sq), -beta, -alpha, stats, stop, deadline)
+        if value > best:
+            best = value
+            if value > alpha:
+                alpha = value
+                if alpha >= beta:
+                    break
+    return best
+
+def solve_endgame(env, stop=None, deadline=None):
+    # returns (exact disc differential for the player to move, best move, nodes searched)
+    p, o = get_env_bits(env)
+    stats = [0]
+    moves = get_moves_bb(p, o)
+    if not moves:
+        if not get_moves_bb(o, p):
+            return final_score(p, o), None, 1
+        return -solve(o, p, -64, 64, stats, stop, deadline), None, stats[0]
+    alpha = -65
+    best_move = None
+    for sq, flips in order_moves(p, o, moves, ~(p | o) & FULL):
+        value = -solve(o & ~flips, p | flips | (1 << sq), -64, -alpha, stats, stop, deadline)
+        if value > alpha:
+            alpha = value
+            best_move = square_to_move(sq)
+    return alpha, best_move, stats[0]
+
+def get_endgame_move(env, stop=None, stats=None, deadline=None):
+    # stats is an optional stats.SearchStats to fill in
+    start = time.time()
+    score, move, nodes = solve_endgame(env, stop, deadline)
+    end = time.time()
+    elapsed = max(end - start, 1e-9)
+    if stats is not None:
+        stats.source = 'endgame'
+        stats.move, stats.value, stats.solver_nodes = move, score, nodes
+        p, o = get_env_bits(env)
+        stats.depth = (~(p | o) & FULL).bit_count() # solved to the end
+        stats.pv = [move]
+    logger.info(f'endgame solved: exact score: {score:+d}; num states examined: {nodes:,d}; nodes/sec: {nodes / elapsed:,.0f}; seconds elapsed: {end - start:,.2f}')
+    return move
@@ -0,0 +1,154 @@
+from minimax import get_computer_move, SearchTimeout
+from endgame import SolveStopped
+from transposition import TranspositionTable
+from ordering import MoveOrdering
+from book import OpeningBook
+from symmetry import untransform_move
+from patterns import PatternEvaluator
+from position import Position
+import minimax
+from concurrent.futures import ProcessPoolExecutor, wait
+import logging
+import multiprocessing
+import os
+
+logger = logging.getLogger(__name__)
+
+# search state kept by the engine process between moves
+_stop = None
+_tt = None
+_ordering = None
+_book = None
+
+
+def init_engine(stop, tt_size_mb, book_path, patterns_path):
+    global _stop, _tt, _ordering, _book
+    _stop = stop
+    _tt = TranspositionTable(tt_size_mb)
+    _ordering = MoveOrdering()
+    _book = OpeningBook(book_path) if book_path and os.path.exists(book_path) else None
+    if patterns_path and os.path.exists(patterns_path):
+        minimax.EVALUATOR = PatternEvaluator.load(patterns_path)
+
+def clear_engine():
+    _tt.clear()
+    _ordering.clear()
+
+def search_move(position, options):
+    # runs in the engine process: returns (move, expected reply), or None if
+    # the search was stopped
+    env = position.to_env()
+    try:
+        move = get_computer_move(env, tt=_tt, ordering=_ordering, book=_book, stop=_stop, **options)
+    except (SearchTimeout, SolveStopped):
+        return None
+    if _stop.is_set():
+        return None
+    return move, predict_reply(env, move, options.get('symmetric', False))
+
+def predict_reply(env, move, symmetric):
+    # the reply the search expected: the tt move of the position after ours,
+    # or None if there isn't one
+    env.make_move(move)
+    if symmetric:
+        key, sym = env.get_canonical_hash()
+    else:
+        key, sym = env.get_hash(), 0
+    entry = _tt.probe(key)
+    if entry is None or entry[3] is None:
+        return None
+    reply = untransform_move(entry[3], sym)
+    return reply if env.is_valid(*reply) else None
+
+def position_key(env):
+    # pass flags aside, the position a search was started from
+    return env.hash, env.turn
+
+
+class Engine:
+    # searches in a separate process so the game loop never waits on it. once
+    # it has moved it can ponder: search the position after the reply it
+    # expects while the opponent thinks, and keep that search if the opponent
+    # plays the expected reply. every search checks a shared stop flag, so
+    # anything running can be cancelled
+    def __init__(self, tt_size_mb=64, book_path=None, patterns_path=None):
+        # book_path and patterns_path are used when the files exist
+        self.stop = multiprocessing.Event()
+        self.executor = ProcessPoolExecutor(1, initializer=init_engine, initargs=(self.stop, tt_size_mb, book_path, patterns_path))
+        self.future = None # the search for the move asked for
+        self.pondering = None # (position key, options, future) of the ponder search
+        self.reply = None # the reply expected after the last move found
+        self.ponder_hits = 0
+        self.ponder_misses = 0
+        # start the process now rather than at the first search
+        self.executor.submit(clear_engine).result()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.cancel()
+        self.executor.shutdown()
+
+    def request(self, env, **options):
+        # start looking for a move in env; options go to get_computer_move.
+        # poll() gives the move when it is ready
+        if self.pondering is not None:
+            key, ponder_options, future = self.pondering
+            if key == position_key(env) and ponder_options == options:
+                self.ponder_hits += 1
+                self.pondering = None
+                self.future = future
+                return
+            self.ponder_misses += 1
+        self.cancel()
+        self.future = self.executor.submit(search_move, Position.from_env(env), options)
+
+    def poll(self):
+        # (True, move) once the move asked for is ready, (False, None) until then
+        if self.future is None or not self.future.done():
+            return False, None
+        result = self.future.result()
+        self.future = None
+        if result is None:
+            return False, None
+        move, self.reply = result
+        return True, move
+
+    def ponder(self, env, **options):
+        # env is the position after the engine's move, with the opponent to
+        # move; options are the ones the next request will use. returns the
+        # reply being pondered, or None
+        reply, self.reply = self.reply, None
+        if reply is None or not env.is_valid(*reply):
+            return None
+        position = Position.from_env(env).play(reply)
+        env = position.to_env()
+        self.pondering = (position_key(env), options, self.executor.submit(search_move, position, options))
+        return reply
+
+    def cancel(self):
+        # stop whatever the engine process is searching and wait until it has.
+        # the results are thrown away, so a search that failed is only logged
+        # rather than raised from here
+        futures = [f for f in (self.future, self.pondering and self.pondering[2]) if f is not None]
+        if futures:
+            self.stop.set()
+            wait(futures)
+            self.stop.clear()
+            for future in futures:
+                if not future.cancelled() and future.exception() is not None:
+                    logger.warning(f'cancelled search failed: {future.exception()!r}')
+        self.future = None
+        self.pondering = None
+
+    def new_game(self):
+        self.cancel()
+        self.reply = None
+        self.executor.submit(clear_engine).result()
+
+    def stats(self):
+        return f'ponder hits: {self.ponder_hits:,d}; misses: {self.ponder_misses:,d}'
@@ -0,0 +1,57 @@
+from othello import ZOBRIST_TURN
+from collections import OrderedDict
+
+# leaf scores depend only on the discs and on the player they are scored for,
+# so they can be kept by the zobrist key of the discs with that player folded
+# in. every process has its own cache: parallel workers and the engine process
+# fill theirs separately and never share entries
+
+
+def cache_key(max_player, env):
+    return env.hash ^ ZOBRIST_TURN if max_player == env.white else env.hash
+
+
+class EvalCache:
+    # least recently used entries are dropped once there are max_entries;
+    # a python dict entry takes roughly 100 bytes
+    def __init__(self, max_entries=1 << 16):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.source = None # (weights, evaluator) the cached scores came from
+        self.reset_stats()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.entries.clear()
+        self.reset_stats()
+
+    def use(self, weights, evaluator):
+        # scores from other heuristic weights or another evaluator are no good
+        if self.source is None or self.source[0] is not weights or self.source[1] is not evaluator:
+            self.clear()
+            self.source = (weights, evaluator)
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        probes = self.hits + self.misses
+        rate = self.hits / probes if probes else 0
+        return f'eval cache hits: {self.hits:,d}; misses: {self.misses:,d}; hit rate: {rate:.1%}; entries: {len(self):,d}'
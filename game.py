@@ -4,8 +4,9 @@ from othello import Othello
 import random
 import math
 import time
-from minimax import get_computer_move
-import threading
+import logging
+from engine import Engine
+from records import write_transcript
 
 # H for human, C for computer, R for random
 
@@ -15,8 +16,24 @@ PLAYER2 = "C"
 DIFFICULTY = 4 # difficulty (1-8) will take longer with higher values
 DIFFICULTY2 = DIFFICULTY
 
+TIME_LIMIT = None # seconds per computer move; when set, search deepens until time runs out instead of using DIFFICULTY
+
+TT_SIZE_MB = 64 # memory cap for the transposition table, kept for the whole game
+
+SYMMETRIC_TT = False # key the transposition table on the canonical board, so the 8 symmetric copies of a position share entries
+
+BOOK_PATH = "book.bin" # opening book built by "python book.py"; the computer plays from it when the file exists
+
+PATTERNS_PATH = "patterns.npy" # pattern weights trained by "python patterns.py"; without the file the hand-tuned heuristic is used
+
+GAMES_PATH = "games.txt" # finished games are appended here as transcripts ("python records.py games.txt" makes a position database); None keeps no record
+
+PONDER = True # search the expected reply on the human's time; moves come back at once when the guess is right
+
 COMP_DELAY = 100 # min time for computer move, does not affect difficulty just for aesthetics
 
+FPS = 30 # frame cap while the computer is thinking; otherwise the loop sleeps until an event arrives
+
 SCREEN_WIDTH = 504
 SCREEN_HEIGHT = 504
 x_off = y_off = math.ceil(SCREEN_WIDTH / 18)
@@ -49,37 +66,77 @@ def init_rects(surface):
             rects[x][y] = pygame.Rect(x_off + x*SQ_SIZE, y_off + y*SQ_SIZE, SQ_SIZE, SQ_SIZE)
     return rects       
 
-def draw_pieces(surface, env, rects):
-    board = env.board
-    for x, arr in enumerate(board):
-        for y, p in enumerate(arr):
-            if board[x][y] == env.black:
-                pygame.draw.circle(surface, (0,25,0), rects[x][y].center, SQ_SIZE / 2 - 1)
-            if board[x][y] == env.white:
-                pygame.draw.circle(surface, (235,255,235), rects[x][y].center, SQ_SIZE / 2 - 1)
-
-def draw_moves(surface, env, moves, rects):
-    if not moves:
-        return
-    board = env.board
-    for move in moves:
-        rect = rects[move[0]][move[1]]
-        s = pygame.Surface((SQ_SIZE,SQ_SIZE), pygame.SRCALPHA)
-        s.fill((0,0,0,128))
-        surface.blit(s, (rect.x,rect.y))
-    pygame.display.update()
-
-def update(surface, env, rects):
-    surface.fill(pygame.Color(5,128,5)) 
-    draw_squares(surface)
-    draw_pieces(surface, env, rects)
-
-def computer_move(env, difficulty, move_wrapper):
-    move_wrapper[0] = get_computer_move(env, max_depth=difficulty)
+def disc_surface(color):
+    s = pygame.Surface((SQ_SIZE,SQ_SIZE), pygame.SRCALPHA)
+    pygame.draw.circle(s, color, (SQ_SIZE / 2, SQ_SIZE / 2), SQ_SIZE / 2 - 1)
+    return s
+
+class Renderer:
+    # redraws only the squares whose disc or move hint changed since the last
+    # frame, from a pre-rendered empty board and cached disc surfaces
+    def __init__(self, surface, env, rects):
+        self.surface = surface
+        self.rects = rects
+        self.background = pygame.Surface(surface.get_size())
+        self.background.fill(pygame.Color(5,128,5))
+        draw_squares(self.background)
+        self.discs = {env.black: disc_surface((0,25,0)), env.white: disc_surface((235,255,235))}
+        self.hint = pygame.Surface((SQ_SIZE,SQ_SIZE), pygame.SRCALPHA)
+        self.hint.fill((0,0,0,128))
+        self.invalidate()
+
+    def invalidate(self):
+        # forget what is on screen, so the next draw repaints everything
+        self.shown = [[None] * 8 for _ in range(8)]
+        self.full = True
+
+    def draw(self, env, hints=None):
+        # returns the rects that changed, for pygame.display.update
+        dirty = []
+        if self.full:
+            self.surface.blit(self.background, (0,0))
+            dirty.append(self.surface.get_rect())
+            self.full = False
+        hints = set(map(tuple, hints or []))
+        board = env.board
+        for x in range(8):
+            for y in range(8):
+                state = (board[x, y], (x, y) in hints)
+                if self.shown[x][y] == state:
+                    continue
+                self.shown[x][y] = state
+                rect = self.rects[x][y]
+                self.surface.blit(self.background, rect, rect)
+                if state[0] != 0:
+                    self.surface.blit(self.discs[state[0]], rect)
+                if state[1]:
+                    self.surface.blit(self.hint, rect)
+                dirty.append(rect)
+        return dirty
+
+def search_options(env, player):
+    # get_computer_move options for the computer playing player
+    difficulty = DIFFICULTY if player == env.black else DIFFICULTY2
+    return dict(max_depth=difficulty, time_limit=TIME_LIMIT, symmetric=SYMMETRIC_TT)
+
+def is_player(env, player, kind):
+    return player == env.black and PLAYER1 == kind or player == env.white and PLAYER2 == kind
+
+def save_game(moves):
+    transcript = write_transcript(moves)
+    logging.info(f'game record: {transcript}')
+    if GAMES_PATH:
+        with open(GAMES_PATH, 'a') as f:
+            f.write(transcript + '\n')
 
 def main():
     env = Othello()
+    moves = [] # this game's moves, None for a pass
     valid_moves = env.get_moves()
+    # the searches log a line per move and per iteration
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    # started before pygame so the engine process doesn't inherit it
+    engine = Engine(TT_SIZE_MB, BOOK_PATH, PATTERNS_PATH)
 
     pygame.init()
 
@@ -88,21 +145,27 @@ def main():
 
     font = pygame.font.SysFont("bauhaus93",60)
 
-    surface.fill(pygame.Color(5,128,5))
-    draw_squares(surface)
     rects = init_rects(surface)
-    draw_pieces(surface, env, rects)
-
-    pygame.display.update()
+    renderer = Renderer(surface, env, rects)
+    clock = pygame.time.Clock()
 
     game_over = False
     space_down = False
 
-    t = None
+    searching = False
 
     while True:
-        for event in pygame.event.get():
+        # nothing changes on the human's turn or after the game until an
+        # event arrives, so sleep until then instead of polling; a game that
+        # has just ended still needs its result shown and saved first
+        if env.terminal():
+            busy = not game_over
+        else:
+            busy = is_player(env, env.turn, "C") or is_player(env, env.turn, "R")
+        events = pygame.event.get() if busy else [pygame.event.wait()] + pygame.event.get()
+        for event in events:
             if event.type == pygame.QUIT:
+                engine.close()
                 pygame.quit()
                 sys.exit()
             if event.type == pygame.MOUSEBUTTONDOWN:
@@ -110,35 +173,38 @@ def main():
                     for y, r in enumerate(arr):       
                         if r.collidepoint(pygame.mouse.get_pos()):
                             # print(valid_moves)
-                            if env.turn == env.black and PLAYER1 == "H" or env.turn == env.white and PLAYER2 == "H":
+                            if is_player(env, env.turn, "H"):
                                 if not valid_moves:
                                     env.make_move(None)
+                                    moves.append(None)
                                     valid_moves = env.get_moves()
                                 elif (x,y) in valid_moves:
                                     env.make_move([x,y])
+                                    moves.append((x, y))
                                     valid_moves = env.get_moves()
                                     # print(env.turn)
                                     env.print_board()
-                                update(surface, env, rects)
-                                pygame.display.update()
             if event.type == pygame.KEYDOWN:
-                if env.terminal() and event.key == pygame.K_RETURN:
+                if event.key == pygame.K_RETURN:
+                    # new game, abandoning any search still running
                     env = Othello()
-                    update(surface, env, rects)
+                    moves = []
+                    engine.new_game()
+                    searching = False
+                    renderer.invalidate()
                     valid_moves = env.get_moves()
-                    pygame.display.update()
                     game_over = False
                 if event.key == pygame.K_SPACE:
-                    #draw_moves(surface, env, valid_moves, rects)
                     space_down = True
             if event.type == pygame.KEYUP:
                 if event.key == pygame.K_SPACE:
-                    #update(surface, env, rects)
                     space_down = False
                 
 
         if env.terminal():
             if not game_over:
+                # show the final position under the result
+                pygame.display.update(renderer.draw(env))
                 winScreen = pygame.Surface((SCREEN_WIDTH,SCREEN_HEIGHT), pygame.SRCALPHA)
                 winScreen.fill((255,255,255,128))
                 winner = env.get_winner()
@@ -152,47 +218,48 @@ def main():
                 winScreen.blit(text, text_rect)
                 surface.blit(winScreen, (0,0))
                 game_over = True
+                save_game(moves)
                 pygame.display.update()
             continue
-        if env.turn == env.black and PLAYER1 == "C" or env.turn == env.white and PLAYER2 == "C":
-            if not t:
-                # print(env.turn)
+        if is_player(env, env.turn, "C"):
+            if not searching:
                 start = time.time()
-                move_wrapper = [None]
-                if env.turn == env.black:
-                    t = threading.Thread(target=computer_move, args=(env, DIFFICULTY, move_wrapper), daemon=True)
-                else:
-                    t = threading.Thread(target=computer_move, args=(env, DIFFICULTY2, move_wrapper), daemon=True)
-                t.start()
-            elif not t.is_alive():
-                move = move_wrapper[0]
-                end = time.time()
-                delTime = COMP_DELAY - (int)((end - start) * COMP_DELAY)
-                pygame.time.delay(delTime)
-                env.make_move(move)
-                valid_moves = env.get_moves()
-                env.print_board()
-                t = None
-        elif env.turn == env.black and PLAYER1 == "R" or env.turn == env.white and PLAYER2 == "R":
+                engine.request(env, **search_options(env, env.turn))
+                searching = True
+            else:
+                done, move = engine.poll()
+                if done:
+                    end = time.time()
+                    delTime = COMP_DELAY - (int)((end - start) * COMP_DELAY)
+                    pygame.time.delay(delTime)
+                    player = env.turn
+                    env.make_move(move)
+                    moves.append(move)
+                    valid_moves = env.get_moves()
+                    env.print_board()
+                    searching = False
+                    if PONDER and is_player(env, env.turn, "H") and not env.terminal():
+                        engine.ponder(env, **search_options(env, player))
+        elif is_player(env, env.turn, "R"):
             # print(env.turn)
             if valid_moves:
                 start = time.time()
                 move = random.choice(valid_moves)
                 env.make_move(move)
+                moves.append(move)
                 end = time.time()
                 delTime = COMP_DELAY - (int)((end - start) * COMP_DELAY)
                 pygame.time.delay(delTime)
             else:
                 env.make_move(None)
+                moves.append(None)
             valid_moves = env.get_moves()
             env.print_board()
-            
-        #draw_pieces(surface, env, rects)
-        update(surface, env, rects)
-        if space_down:
-            draw_moves(surface, env, valid_moves, rects)
 
-        pygame.display.update()
+        dirty = renderer.draw(env, valid_moves if space_down else None)
+        if dirty:
+            pygame.display.update(dirty)
+        clock.tick(FPS)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,102 @@
+from bitboard import BitboardOthello
+from records import write_transcript
+import argparse
+import asyncio
+import json
+import random
+import time
+import numpy as np
+
+# concurrent sessions against a running server.py, each asking for the same
+# positions in its own order, one request at a time; reports throughput and
+# latency percentiles. positions asked for by several sessions at once are
+# searched once by the server
+
+
+def make_positions(num_positions, seed=0):
+    # transcripts of random games cut off 10 to 40 moves in
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < num_positions:
+        env = BitboardOthello()
+        moves = []
+        for _ in range(rng.randint(10, 40)):
+            if env.terminal():
+                break
+            legal = env.get_moves()
+            move = rng.choice(legal) if legal else None
+            env.make_move(move)
+            moves.append(move)
+        if not env.terminal():
+            positions.append(write_transcript(moves))
+    return positions
+
+async def request(reader, writer, message):
+    writer.write((json.dumps(message) + '\n').encode())
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+async def session(host, port, requests, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    for message in requests:
+        start = time.perf_counter()
+        reply = await request(reader, writer, message)
+        latencies.append(time.perf_counter() - start)
+        if 'error' in reply:
+            errors.append(reply['error'])
+    writer.close()
+    await writer.wait_closed()
+
+async def load_test(host, port, positions, sessions, depth=None, time_limit=None, seed=0):
+    # returns a dict of results, with the server's counters after the run
+    rng = random.Random(seed)
+    budget = {key: value for key, value in (('depth', depth), ('time', time_limit)) if value is not None}
+    plans = []
+    for _ in range(sessions):
+        order = list(positions)
+        rng.shuffle(order)
+        plans.append([dict(budget, moves=moves) for moves in order])
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    await asyncio.gather(*(session(host, port, plan, latencies, errors) for plan in plans))
+    elapsed = time.perf_counter() - start
+    reader, writer = await asyncio.open_connection(host, port)
+    server = await request(reader, writer, {'stats': True})
+    writer.close()
+    await writer.wait_closed()
+    return {
+        'sessions': sessions,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'seconds': elapsed,
+        'throughput': len(latencies) / elapsed,
+        'p50': float(np.percentile(latencies, 50)),
+        'p99': float(np.percentile(latencies, 99)),
+        'server': server,
+    }
+
+def format_results(results):
+    server = results['server']
+    return (f'{results["sessions"]} sessions: {results["requests"]:,d} requests in {results["seconds"]:,.2f} seconds; '
+            f'{results["throughput"]:,.1f} requests/sec; p50 {1000 * results["p50"]:,.0f} ms; p99 {1000 * results["p99"]:,.0f} ms; '
+            f'errors: {results["errors"]}; server searches: {server["searches"]:,d}; coalesced: {server["coalesced"]:,d}')
+
+def main():
+    parser = argparse.ArgumentParser(description='load test a running server.py')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--sessions', type=int, default=8)
+    parser.add_argument('--positions', type=int, default=20, help='distinct positions, asked for by every session')
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--time', type=float, default=None, help='seconds per search instead of a fixed depth')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    positions = make_positions(args.positions, args.seed)
+    depth = None if args.time else args.depth
+    results = asyncio.run(load_test(args.host, args.port, positions, args.sessions, depth, args.time, args.seed))
+    print(format_results(results))
+
+if __name__ == '__main__':
+    main()
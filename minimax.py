@@ -1,103 +1,350 @@
 from othello import Othello
-import copy
+from transposition import EXACT, LOWER, UPPER
+from endgame import get_endgame_move, SolveStopped, ENDGAME_EMPTIES
+from bitboard import get_env_bits, get_stability_bb
+from batch import leaf_values, final_value, WEIGHTS
+from symmetry import transform_move, untransform_move
+from stats import SearchStats
+from evalcache import EvalCache, cache_key
 import numpy as np
+import copy
+import logging
+import math
 import time
 
+logger = logging.getLogger(__name__)
+
+
+# score the last ply in one numpy pass (batch.leaf_values) when a search isn't
+# told otherwise. the fixed cost of the pass is more than scoring each leaf
+# below about 16 children, and single leaves are also cut by alpha-beta, so
+# it's off; "benchmark.py batch" measures both
+BATCH_LEAVES = False
+ENDGAME_TIME_SHARE = 0.5 # part of a move's time limit the exact solve may use before the search takes over
+ASPIRATION_WINDOW = 1000 # half width of the first window around the previous iteration's value
+EVALUATOR = None # a patterns.PatternEvaluator to score leaves with in place of heuristic
+EVAL_CACHE = EvalCache() # leaf scores kept between searches in this process; None turns the cache off
+MAX_PLY = 128
+
+
+class SearchTimeout(Exception):
+    pass
+
+class Search:
+    # state for one search: options, counters and the principal variation
+    def __init__(self, tt=None, ordering=None, batch=None, deadline=None, first_move=None, symmetric=False, stop=None,
+                 stats=None, profile=False, hooks=None):
+        self.tt = tt
+        self.stop = stop # optional event; once it is set the search raises SearchTimeout
+        self.symmetric = symmetric # key the tt on the canonical board, so symmetric positions share entries
+        self.ordering = ordering
+        self.batch = BATCH_LEAVES if batch is None else batch
+        self.deadline = deadline
+        self.first_move = first_move # tried first at the root
+        self.stats = stats if stats is not None else SearchStats(MAX_PLY)
+        self.profile = profile # time move generation, evaluation and making moves
+        self.hooks = hooks # an optional stats.SearchHooks
+        self.pv = [[] for _ in range(MAX_PLY + 1)]
+        if EVAL_CACHE is not None:
+            EVAL_CACHE.use(WEIGHTS, EVALUATOR)
+
+    def run(self, env, max_depth, alpha=float('-inf'), beta=float('inf')):
+        # returns the value for the player to move and the principal variation
+        value = negamax(env, alpha, beta, 0, max_depth, self)
+        return value, list(self.pv[0])
+
+def format_pv(pv):
+    return ' '.join('pass' if move is None else f'{move[0]},{move[1]}' for move in pv)
+
+def get_computer_move(env, *args, **kwargs):
+    # find_move without the statistics
+    return find_move(env, *args, **kwargs)[0]
 
-def get_computer_move(env, max_depth=4):
-    NUM_STATES = [0, 0]
-    start = time.time()
-    value, move = MaxValue(env.turn, env, float('-inf'), float('inf'), 0, max_depth, NUM_STATES)
-    end = time.time()
-    print(f'num states examined: {NUM_STATES[0]:,d}; pruned ≈ {NUM_STATES[1]:,d}; depth: {max_depth}; max value: {value:,.0f}; seconds elapsed: {end - start:,.2f}')
-    return move
+def find_move(env, max_depth=None, tt=None, time_limit=None, endgame_empties=ENDGAME_EMPTIES, batch=None, ordering=None, book=None, symmetric=False, stop=None,
+              profile=False, hooks=None):
+    # returns the move and a stats.SearchStats for the search that found it.
+    # fixed depth search by default, iterative deepening when given a time limit in seconds,
+    # and an exact solve once few enough squares are empty; with a time limit
+    # the solve gets ENDGAME_TIME_SHARE of it, and iterative deepening the rest
+    # if it doesn't finish. with batch the
+    # positions one ply above the depth limit score all their children at once;
+    # None leaves it to BATCH_LEAVES.
+    # ordering is an optional MoveOrdering, otherwise moves are tried in scan order.
+    # book is an optional OpeningBook, tried before searching. symmetric keys
+    # the tt on the canonical board. stop is an optional event (threading or
+    # multiprocessing) that cancels the search; a cancelled fixed depth search
+    # raises SearchTimeout (SolveStopped in the endgame), and iterative
+    # deepening returns its best move so far. profile splits the search time
+    # between move generation, evaluation and making moves, and hooks is an
+    # optional stats.SearchHooks
+    stats = SearchStats(MAX_PLY)
+    if hooks is not None:
+        hooks.on_search_start(env)
+    start = time.perf_counter()
+    entry = book.probe(env) if book is not None else None
+    if entry is not None:
+        stats.source = 'book'
+        stats.move, stats.value, stats.depth = entry
+        stats.pv = [stats.move]
+        logger.info(f'book move: {format_pv(stats.pv)}; value: {stats.value:,d}; depth: {stats.depth}; '
+                    f'seconds elapsed: {time.perf_counter() - start:,.6f}; {book.stats()}')
+    elif endgame_empties and env.get_num_empty() <= endgame_empties and solve_in_time(env, time_limit, stop, stats):
+        pass
+    elif time_limit is not None:
+        iterative_deepening(env, max(0, time_limit - (time.perf_counter() - start)), max_depth, tt, batch, ordering, symmetric, stop, stats, profile, hooks)
+    else:
+        if max_depth is None:
+            max_depth = 4
+        if tt is not None:
+            tt.new_search()
+        if ordering is not None:
+            ordering.new_search()
+        search = Search(tt, ordering, batch, symmetric=symmetric, stop=stop, stats=stats, profile=profile, hooks=hooks)
+        stats.value, stats.pv = search.run(env, max_depth)
+        stats.move = stats.pv[0] if stats.pv else None
+        stats.depth = max_depth
+        stats.seconds = time.perf_counter() - start
+        tt_stats = f'; {tt.stats()}' if tt is not None else ''
+        logger.info(f'{stats.summary()}; depth: {max_depth}; max value: {stats.value:,.0f}; pv: {format_pv(stats.pv)}; '
+                    f'seconds elapsed: {stats.seconds:,.2f}{tt_stats}')
+    stats.seconds = time.perf_counter() - start
+    if hooks is not None:
+        hooks.on_search_end(stats)
+    return stats.move, stats
+
+def solve_in_time(env, time_limit, stop, stats):
+    # the exact endgame solve, given part of time_limit when there is one;
+    # returns False if it ran out of time, so the caller can search instead
+    deadline = time.time() + ENDGAME_TIME_SHARE * time_limit if time_limit is not None else None
+    try:
+        get_endgame_move(env, stop, stats, deadline)
+    except SolveStopped:
+        if deadline is None or stop is not None and stop.is_set():
+            raise
+        logger.info(f'endgame solve: no result in {ENDGAME_TIME_SHARE * time_limit:,.2f} seconds; searching instead')
+        return False
+    return True
+
+def iterative_deepening(env, time_limit, max_depth=None, tt=None, batch=None, ordering=None, symmetric=False, stop=None,
+                        stats=None, profile=False, hooks=None):
+    # returns the best move found in time, and fills in stats if given
+    start = time.perf_counter()
+    search = Search(tt, ordering, batch, symmetric=symmetric, stop=stop, stats=stats, profile=profile, hooks=hooks)
+    stats = search.stats
+    # an aborted iteration leaves moves made on the board, so search a copy
+    env = stats.timed('copy', copy.deepcopy, env)
+    empties = env.get_num_empty()
+    if max_depth is None or max_depth > empties:
+        max_depth = max(1, empties)
+    if tt is not None:
+        tt.new_search()
+    if ordering is not None:
+        ordering.new_search()
+    deadline = time.time() + time_limit
+    pv = []
+    value = 0
+    for depth in range(1, max_depth + 1):
+        iter_start = time.perf_counter()
+        iter_nodes = stats.nodes
+        # the first iteration always finishes so there is a move to return
+        search.deadline = deadline if depth > 1 else None
+        search.first_move = pv[0] if pv else None
+        try:
+            value2, pv2 = aspiration_search(env, depth, search, value if depth > 1 else None)
+        except SearchTimeout:
+            reason = 'stopped' if stop is not None and stop.is_set() else 'timed out'
+            logger.info(f'depth {depth}: {reason} after {time.perf_counter() - iter_start:,.2f} seconds')
+            break
+        iter_end = time.perf_counter()
+        value, pv = value2, pv2
+        stats.value, stats.pv, stats.depth = value, pv, depth
+        stats.move = pv[0] if pv else None
+        iteration = {'depth': depth, 'value': value, 'pv': format_pv(pv), 'nodes': stats.nodes - iter_nodes, 'seconds': iter_end - iter_start}
+        stats.iterations.append(iteration)
+        if hooks is not None:
+            hooks.on_iteration(stats, iteration)
+        logger.info(f'depth {depth}: pv: {iteration["pv"]}; value: {value:,.0f}; num states examined: {iteration["nodes"]:,d}; '
+                    f'seconds elapsed: {iteration["seconds"]:,.2f}')
+        # stop once the game is decided or the next iteration can't finish in time
+        if abs(value) == float('inf') or deadline - time.time() < iter_end - iter_start:
+            break
+    stats.seconds = time.perf_counter() - start
+    tt_stats = f'; {tt.stats()}' if tt is not None else ''
+    logger.info(f'{stats.summary()}; depth reached: {stats.depth}; max value: {value:,.0f}; seconds elapsed: {stats.seconds:,.2f}{tt_stats}')
+    return stats.move
+
+def aspiration_search(env, max_depth, search, guess=None):
+    # search a window around the previous value first; a value outside it is
+    # only a bound, so open that side of the window and search again
+    if guess is None or abs(guess) == float('inf'):
+        return search.run(env, max_depth)
+    alpha = guess - ASPIRATION_WINDOW
+    beta = guess + ASPIRATION_WINDOW
+    while True:
+        value, pv = search.run(env, max_depth, alpha, beta)
+        if value <= alpha:
+            alpha = float('-inf')
+        elif value >= beta:
+            beta = float('inf')
+        else:
+            return value, pv
 
-def MaxValue(player, env, alpha, beta, depth, max_depth, num_states):
-    num_states[0] += 1
-    if env.get_winner() == player:
-        return float('inf'), None
-    elif env.get_winner() == -player:
-        return float('-inf'), None
+def negamax(env, alpha, beta, depth, max_depth, search):
+    # value of the position for the player to move, searched with principal
+    # variation search: the first move gets the full window, the rest a null
+    # window that only asks whether they beat alpha
+    if search.deadline is not None and time.time() > search.deadline:
+        raise SearchTimeout
+    if search.stop is not None and search.stop.is_set():
+        raise SearchTimeout
+    stats = search.stats
+    stats.nodes_by_ply[depth] += 1
+    search.pv[depth] = []
+    player = env.turn
+    # a full board is the end of the game; the other way it ends, neither
+    # player having a move, shows when there are no moves below
+    if env.get_num_empty() == 0:
+        return final_value(player, env)
     if depth >= max_depth: # evaluate node with utility function if maxdepth reached
-        return heuristic(player, env), None
-    moves = env.get_moves()
+        stats.leaf_evals += 1
+        return stats.timed('eval', evaluate, player, env) if search.profile else evaluate(player, env)
+    tt = search.tt
+    alpha_orig, beta_orig = alpha, beta
+    entry = None
+    if tt is not None:
+        if search.symmetric:
+            # moves are stored on the canonical board
+            key, sym = env.get_canonical_hash()
+        else:
+            key, sym = env.get_hash(), 0
+        stats.tt_probes += 1
+        entry, usable = probe_tt(tt, key, depth, max_depth)
+        if entry:
+            stats.tt_hits += 1
+        if entry and sym:
+            entry = entry[:3] + (untransform_move(entry[3], sym),)
+        if usable:
+            _, flag, tt_value, tt_move = entry
+            if flag == EXACT:
+                stats.tt_cutoffs += 1
+                search.pv[depth] = [tt_move]
+                return tt_value
+            elif flag == LOWER:
+                alpha = max(alpha, tt_value)
+            elif flag == UPPER:
+                beta = min(beta, tt_value)
+            if alpha >= beta:
+                stats.tt_cutoffs += 1
+                return tt_value
+    profile = search.profile
+    moves = stats.timed('movegen', env.get_moves) if profile else env.get_moves()
+    if not moves:
+        if not env.has_moves(-player):
+            return final_value(player, env)
+        undo = stats.timed('make', env.make_move, None) if profile else env.make_move(None)
+        value = -negamax(env, -beta, -alpha, depth + 1, max_depth, search)
+        if profile:
+            stats.timed('make', env.unmake_move, undo)
+        else:
+            env.unmake_move(undo)
+        search.pv[depth] = [None] + search.pv[depth + 1]
+        return value
+    ordering = search.ordering
+    if ordering is not None:
+        ordering.order(moves, depth)
+    if entry:
+        order_tt_move(moves, entry[3])
+    if depth == 0 and search.first_move:
+        order_tt_move(moves, search.first_move)
+    leaves = None
+    if search.batch and depth + 1 == max_depth:
+        # the children are all leaves, so score them in one pass
+        stats.leaf_evals += len(moves)
+        if profile:
+            leaves = stats.timed('eval', leaf_values, player, env, moves, WEIGHTS, EVALUATOR, EVAL_CACHE)
+        else:
+            leaves = leaf_values(player, env, moves, WEIGHTS, EVALUATOR, EVAL_CACHE)
     value = float('-inf')
     best_move = None
-    if not moves:
-        env2 = copy.deepcopy(env)
-        env2.make_move(None)
-        return MinValue(-player, env, alpha, beta, depth+1, max_depth, num_states)
-    for move in moves:
-        env2 = copy.deepcopy(env)
-        env2.make_move(move)
-        # find the move that the min player would pick
-        value2, move2 =  MinValue(-player, env2, alpha, beta, depth + 1, max_depth, num_states)
-        # if its better than the best so far, save it
-        if value2 >= value:
+    for i, move in enumerate(moves):
+        if leaves is not None:
+            stats.nodes_by_ply[depth + 1] += 1
+            search.pv[depth + 1] = []
+            value2 = leaves[i]
+        else:
+            undo = stats.timed('make', env.make_move, move) if profile else env.make_move(move)
+            if best_move is None or alpha == float('-inf'):
+                value2 = -negamax(env, -beta, -alpha, depth + 1, max_depth, search)
+            else:
+                value2 = -negamax(env, -math.nextafter(alpha, float('inf')), -alpha, depth + 1, max_depth, search)
+                if alpha < value2 < beta:
+                    # it beat alpha, so find out by how much
+                    value2 = -negamax(env, -beta, -value2, depth + 1, max_depth, search)
+            if profile:
+                stats.timed('make', env.unmake_move, undo)
+            else:
+                env.unmake_move(undo)
+        if best_move is None or value2 > value:
             value = value2
             best_move = move
-            alpha = max(alpha, value)
-        # if pruning, prune what you can
+            if value > alpha:
+                alpha = value
+                search.pv[depth] = [move] + search.pv[depth + 1]
         if value >= beta:
-            num_states[1] += 10**(max_depth - depth)
-            return value, best_move
+            stats.cutoffs_by_index[i] += 1
+            if search.hooks is not None:
+                search.hooks.on_cutoff(depth, i, move)
+            if ordering is not None:
+                ordering.record_cutoff(move, depth, max_depth - depth)
+            break
+    if not search.pv[depth]:
+        # failed low: still report the move that did best
+        search.pv[depth] = [best_move]
 
-    return value, best_move
+    if tt is not None:
+        if value <= alpha_orig:
+            flag = UPPER
+        elif value >= beta_orig:
+            flag = LOWER
+        else:
+            flag = EXACT
+        tt.store(key, max_depth - depth, flag, value, transform_move(best_move, sym))
+    return value
 
-    
-def MinValue(player, env, alpha, beta, depth, max_depth, num_states):
-    num_states[0] += 1
-    if env.get_winner() == -player:
-        return float('inf'), None
-    elif env.get_winner() == player:
-        return float('-inf'), None
-    if depth >= max_depth: # evaluate node with utility function if maxdepth reached
-        return heuristic(-player, env), None
-    moves = env.get_moves()
-    value = float('inf')
-    best_move = None
-    if not moves:
-        env2 = copy.deepcopy(env)
-        env2.make_move(None)
-        return MaxValue(-player, env, alpha, beta, depth+1, max_depth, num_states)
-    for move in moves:
-        env2 = copy.deepcopy(env)
-        env2.make_move(move)
-        # find the move that max player would choose
-        value2, move2 =  MaxValue(-player, env2, alpha, beta, depth + 1, max_depth, num_states)
-        # if the move is lower than what has been found, save it
-        if value2 < value:
-            value = value2
-            best_move = move
-            beta = min(beta, value)
-        # if pruning, prune
-        if value <= alpha:
-            num_states[1] += 10**(max_depth - depth)
-            return value, best_move
-    return value, best_move
+def probe_tt(tt, key, depth, max_depth):
+    # returns the stored entry and whether its value is usable at this depth;
+    # values are stored from the point of view of the player to move
+    entry = tt.probe(key)
+    if entry is None:
+        return None, None
+    return entry, depth > 0 and entry[0] >= max_depth - depth
+
+def order_tt_move(moves, tt_move):
+    if tt_move in moves:
+        moves.remove(tt_move)
+        moves.insert(0, tt_move)
 
 def coin_parity(max_player, env):
-    if max_player == env.black:
-        max_coins = env.get_num_black()
-        min_coins = env.get_num_white()
-    else:
-        max_coins = env.get_num_white()
-        min_coins = env.get_num_black()
-    return 100 * (max_coins - min_coins) / (max_coins + min_coins)
+    # the disc counts are kept up to date by the board, so this is cheap
+    num_black = env.get_num_black()
+    num_white = env.get_num_white()
+    diff = num_black - num_white if max_player == env.black else num_white - num_black
+    return 100 * diff / (num_black + num_white)
 
 def mobility(max_player, env):
-    env2 = copy.deepcopy(env)
-    env2.turn = max_player
-    max_moves = env2.get_moves()
-    env2.turn = -max_player
-    min_moves = env2.get_moves()
+    max_moves = env.count_moves(max_player)
+    min_moves = env.count_moves(-max_player)
+    if not max_moves and not min_moves:
+        return 0
+    return 100 * (max_moves - min_moves) / (max_moves + min_moves)
+
+def potential_mobility(max_player, env):
+    # empty squares next to the opponent's discs: moves a player may get later
+    max_moves = env.count_potential_moves(max_player)
+    min_moves = env.count_potential_moves(-max_player)
     if not max_moves and not min_moves:
         return 0
-    if not max_moves:
-        max_moves = []
-    if not min_moves:
-        min_moves = []
-    return 100 * (len(max_moves) - len(min_moves)) / (len(max_moves) + len(min_moves))
+    return 100 * (max_moves - min_moves) / (max_moves + min_moves)
 
 def corners_captured(max_player, env):
     max_corners = 0
@@ -109,7 +356,7 @@ def corners_captured(max_player, env):
             min_corners += 1
     return 25 * (max_corners - min_corners), max_corners, min_corners
 
-def protection(env, piece, disc_dict):
+def protection(env, piece, disc_dict, propagate=True):
     PROTECTED = 1
     UNPROTECTED = 0
     TAKEABLE = -1
@@ -164,9 +411,9 @@ def protection(env, piece, disc_dict):
         for piece2 in passed_through:
             if env.board[piece2[0], piece2[1]] == 0:
                 continue
-            if env.board[piece2[0], piece2[1]] == player:
+            if propagate and env.board[piece2[0], piece2[1]] == player:
                 disc_dict[f'{piece2}'][direction] = disc_dict[f'{piece}'][direction]
-            protection(env, piece2, disc_dict)
+            protection(env, piece2, disc_dict, propagate)
 
 def corner_closeness(max_player, env):
     
@@ -226,6 +473,19 @@ def corner_closeness(max_player, env):
     return 12.5 * (max_close - min_close)
 
 def stability(player, env, max_c, min_c):
+    # every disc is judged on its own lines. the evaluator used to count with
+    # stability_recursive(propagate=True), where the first disc of a colour
+    # visited in a filled run hands its result to the others in it and discs
+    # not joined to the first one are never visited; those counts depend on
+    # the visit order, so a third of random-game positions get different
+    # ones once the board is rotated or mirrored. they differ from these on
+    # about a quarter of positions
+    p, o = get_env_bits(env, player)
+    return get_stability_bb(p, o)
+
+def stability_recursive(player, env, max_c, min_c, propagate=True):
+    # the original stability, kept as a reference; propagate=False judges
+    # every disc on its own, as stability does
     PROTECTED = 1
     UNPROTECTED = 0
     TAKEABLE = -1
@@ -236,7 +496,7 @@ def stability(player, env, max_c, min_c):
     discs = [[where[0][i], where[1][i]] for i in range(len(where[0]))]
     for disc in discs:
         disc_dict[f'{disc}'] = [None, None, None, None]
-    protection(env, discs[0], disc_dict)
+    protection(env, discs[0], disc_dict, propagate)
 
     num_stable_p = 0
     num_stable_o = 0
@@ -274,11 +534,32 @@ def stability_heuristic(max_player, env, max_c, min_c):
         return 100 * (score_p - score_o) / (score_p + score_o)
     return 0
 
+def evaluate(max_player, env):
+    # the search's leaf score: the pattern evaluator when one is set,
+    # otherwise the hand-tuned heuristic, looked up in EVAL_CACHE first
+    cache = EVAL_CACHE
+    if cache is not None:
+        key = cache_key(max_player, env)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    if EVALUATOR is not None:
+        value = EVALUATOR.evaluate(max_player, env)
+    else:
+        value = heuristic(max_player, env)
+    if cache is not None:
+        cache.put(key, value)
+    return value
+
 def heuristic(max_player, env):
+    # WEIGHTS can be swapped out at module level, e.g. by tournament.py
     m = mobility(max_player, env)
     p = coin_parity(max_player, env)
     c, max_c, min_c = corners_captured(max_player, env)
     s = stability_heuristic(max_player, env, max_c, min_c)
     l = corner_closeness(max_player, env)
-    # print(10*m + 70*p + 800*c + 50*s - 300*l)
-    return 10*m + 70*p + 800*c + 50*s - 300*l
+    w_m, w_p, w_c, w_s, w_l, w_f = WEIGHTS
+    # potential mobility is only counted when it has a weight
+    f = potential_mobility(max_player, env) if w_f else 0
+    # print(w_m*m + w_p*p + w_c*c + w_s*s - w_l*l)
+    return w_m*m + w_p*p + w_c*c + w_s*s - w_l*l + w_f*f
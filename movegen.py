@@ -0,0 +1,46 @@
+# move generation on bitboards, shared by both board classes; it imports
+# nothing from them, so othello.py and bitboard.py can both import it at the top
+
+# square (x, y) lives at bit 8*y + x, so iterating bits from low to high
+# visits squares in the same order as Othello.get_moves
+FULL = 0xFFFFFFFFFFFFFFFF
+NOT_X0 = 0xFEFEFEFEFEFEFEFE # clears squares that wrapped onto x == 0
+NOT_X7 = 0x7F7F7F7F7F7F7F7F # clears squares that wrapped onto x == 7
+
+# (shift, mask) for the four directions that move towards higher bits and the
+# four that move towards lower bits
+LEFT_DIRS = ((1, NOT_X0), (8, FULL), (9, NOT_X0), (7, NOT_X7))
+RIGHT_DIRS = ((1, NOT_X7), (8, FULL), (9, NOT_X7), (7, NOT_X0))
+
+
+def get_moves_bb(p, o):
+    empty = ~(p | o) & FULL
+    moves = 0
+    for shift, mask in LEFT_DIRS:
+        mo = mask & o
+        t = (p << shift) & mo
+        t |= (t << shift) & mo
+        t |= (t << shift) & mo
+        t |= (t << shift) & mo
+        t |= (t << shift) & mo
+        t |= (t << shift) & mo
+        moves |= (t << shift) & mask
+    for shift, mask in RIGHT_DIRS:
+        mo = mask & o
+        t = (p >> shift) & mo
+        t |= (t >> shift) & mo
+        t |= (t >> shift) & mo
+        t |= (t >> shift) & mo
+        t |= (t >> shift) & mo
+        t |= (t >> shift) & mo
+        moves |= (t >> shift) & mask
+    return moves & empty
+
+def get_potential_moves_bb(p, o):
+    # empty squares next to one of o's discs
+    near = 0
+    for shift, mask in LEFT_DIRS:
+        near |= (o << shift) & mask
+    for shift, mask in RIGHT_DIRS:
+        near |= (o >> shift) & mask
+    return near & ~(p | o) & FULL
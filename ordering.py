@@ -0,0 +1,54 @@
+# static value of each square, indexed [x][y]: corners first, the squares
+# diagonally next to a corner (X squares) and beside it (C squares) last
+SQUARE_VALUES = [
+    [100, -20, 10,  5,  5, 10, -20, 100],
+    [-20, -50, -2, -2, -2, -2, -50, -20],
+    [ 10,  -2, -1, -1, -1, -1,  -2,  10],
+    [  5,  -2, -1, -1, -1, -1,  -2,   5],
+    [  5,  -2, -1, -1, -1, -1,  -2,   5],
+    [ 10,  -2, -1, -1, -1, -1,  -2,  10],
+    [-20, -50, -2, -2, -2, -2, -50, -20],
+    [100, -20, 10,  5,  5, 10, -20, 100],
+]
+
+NUM_KILLERS = 2
+
+
+class MoveOrdering:
+    # orders moves by killer moves for the ply, then the history table, then
+    # the static square values. history is kept between searches so it can be
+    # reused for the whole game
+    def __init__(self, static=True, killers=True, history=True):
+        self.use_static = static
+        self.use_killers = killers
+        self.use_history = history
+        self.clear()
+
+    def clear(self):
+        self.history = [[0] * 8 for _ in range(8)]
+        self.killers = {}
+
+    def new_search(self):
+        # killers only make sense within one search; older history counts for less
+        self.killers = {}
+        self.history = [[h // 2 for h in row] for row in self.history]
+
+    def order(self, moves, ply):
+        killers = self.killers.get(ply, []) if self.use_killers else []
+        def key(move):
+            x, y = move[0], move[1]
+            rank = killers.index(move) if move in killers else NUM_KILLERS
+            history = self.history[x][y] if self.use_history else 0
+            static = SQUARE_VALUES[x][y] if self.use_static else 0
+            return (rank, -history, -static)
+        moves.sort(key=key)
+
+    def record_cutoff(self, move, ply, depth_left):
+        if self.use_killers:
+            killers = self.killers.setdefault(ply, [])
+            if move in killers:
+                killers.remove(move)
+            killers.insert(0, move)
+            del killers[NUM_KILLERS:]
+        if self.use_history:
+            self.history[move[0]][move[1]] += depth_left * depth_left
@@ -1,10 +1,58 @@
 import numpy as np
 import time
 import random
+from symmetry import canonical_bits
+from movegen import get_moves_bb, get_potential_moves_bb
+
+# zobrist keys for each piece on each square (square (x, y) is 8*y + x),
+# plus the side to move and the pass flags
+_rng = random.Random(0x0e110)
+ZOBRIST = {p: [_rng.getrandbits(64) for _ in range(64)] for p in (1, -1)}
+ZOBRIST_TURN = _rng.getrandbits(64)
+ZOBRIST_BLACKPASS = _rng.getrandbits(64)
+ZOBRIST_WHITEPASS = _rng.getrandbits(64)
+
+def bits_hash(black, white):
+    # zobrist key of the discs alone, given as bitboards
+    key = 0
+    for bits, keys in ((black, ZOBRIST[1]), (white, ZOBRIST[-1])):
+        while bits:
+            low = bits & -bits
+            bits ^= low
+            key ^= keys[low.bit_length() - 1]
+    return key
+
+DIRECTIONS = ((-1,-1), (-1,0), (-1,1), (0,-1), (0,1), (1,-1), (1,0), (1,1))
+
+def _ray(x, y, dx, dy):
+    ray = []
+    x, y = x + dx, y + dy
+    while 0 <= x < 8 and 0 <= y < 8:
+        ray.append((x, y))
+        x, y = x + dx, y + dy
+    return tuple(ray)
+
+# RAYS[8*y + x]: the squares in each direction from (x, y), nearest first.
+# a ray needs at least two squares to flip anything, so shorter ones are left out
+RAYS = [tuple(ray for ray in (_ray(sq & 7, sq >> 3, dx, dy) for dx, dy in DIRECTIONS) if len(ray) >= 2)
+        for sq in range(64)]
+# NEIGHBORS[8*y + x]: bitmask of the squares next to (x, y)
+NEIGHBORS = [sum(1 << (8*(y + dy) + x + dx) for dx, dy in DIRECTIONS if 0 <= x + dx < 8 and 0 <= y + dy < 8)
+             for y in range(8) for x in range(8)]
 
 class Othello:
     def __init__(self):
         self.board = np.zeros((8,8), dtype=np.int16)
+        self.hash = 0
+        # bitmasks of the occupied squares and of the empty squares next to a
+        # disc; only frontier squares can be moves
+        self.occupied = 0
+        self.frontier = 0
+        # counts[p]: the number of squares holding p, so counts[0] is the
+        # empty squares, counts[1] black's discs and counts[-1] white's
+        self.counts = [64, 0, 0]
+        # bits[p]: bitmask of the squares holding p, indexed like counts
+        self.bits = [(1 << 64) - 1, 0, 0]
         self.black = 1
         self.white = -1
         self.add_piece(self.white, 3, 3)
@@ -17,10 +65,14 @@ class Othello:
 
     def get_moves(self):
         moves = []
-        for y, arr in enumerate(self.board):
-            for x, p in enumerate(arr):
-                if self.is_valid(x, y):
-                    moves.append((x, y))
+        # lowest square first, the same order as scanning the board row by row
+        bits = self.frontier
+        while bits:
+            low = bits & -bits
+            bits ^= low
+            sq = low.bit_length() - 1
+            if self.is_valid(sq & 7, sq >> 3):
+                moves.append((sq & 7, sq >> 3))
         if len(moves) == 0:
             return None
         if self.turn == self.black:
@@ -30,102 +82,79 @@ class Othello:
         return moves
     
     def make_move(self, move):
+        # returns an undo record for unmake_move
+        undo = (move, [], self.get_piece(move[0], move[1]) if move else 0, self.turn, self.blackpass, self.whitepass, self.hash)
         if not move:
             self.turn = self.get_opp()
             if self.turn == self.black:
                 self.blackpass = True
             elif self.turn == self.white:
                 self.whitepass = True
-            return
+            return undo
         x = move[0]
         y = move[1]
+        flips = self.get_flips(x, y)
         self.add_piece(self.get_turn(), x, y)
-
-        # go in each direction until another of the same color is reached
-        # if not, can't go in that direction
-        # basically have a square around x, y that grows
-        sq_dirs = np.array([[-1,-1],[-1,0],[-1,1],[0,-1],[0,1],[1,-1],[1,0],[1,1]])
-        sq_points = np.array([[x,y] for _ in range(8)])
-        
-        sq_points = sq_points + sq_dirs # move in each direction
-        sq_flips = [[] for _ in range(8)]
-        sq_valid = np.array([False for _ in range(8)])
-
-        # if opponent in that direction
-        for i, sq in enumerate(sq_points):
-            if sq[0] < 0 or sq[1] < 0 or sq[0] >= 8 or sq[1] >= 8:
-                continue
-            if self.get_piece(sq[0], sq[1]) == self.get_opp():
-                sq_flips[i].append(sq)
-                sq_valid[i] = True
-
-        while True:
-            sq_points = sq_points + sq_dirs # move in each direction
-
-            # if opponent in that direction
-            for i, sq in enumerate(sq_points):
-                if sq[0] < 0 or sq[1] < 0 or sq[0] >= 8 or sq[1] >= 8 or not sq_valid[i]:
-                    sq_valid[i] = False
-                    continue
-                if self.get_piece(sq[0], sq[1]) == self.get_opp():
-                    sq_flips[i].append(sq)
-                elif self.get_piece(sq[0], sq[1]) == self.get_turn() and len(sq_flips) != 0:
-                    
-                    for sq2 in sq_flips[i]:
-                        self.flip_piece(sq2[0], sq2[1])
-                    sq_flips[i] = []
-                    sq_valid[i] = False
-                else:
-                    sq_valid[i] = False
-            if not np.any(sq_valid):
-                break
+        for sq in flips:
+            self.flip_piece(sq[0], sq[1])
+        undo[1].extend(flips)
         self.turn = self.get_opp()
+        return undo
 
-    def is_valid(self, x, y):
-        # go in each direction until another of the same color is reached
-        # if not, can't go in that direction
-        # basically have a square around x, y that grows
-        if self.get_piece(x, y) != 0:
-            return False
-        
-        sq_dirs = np.array([[-1,-1],[-1,0],[-1,1],[0,-1],[0,1],[1,-1],[1,0],[1,1]])
-        sq_points = np.array([[x,y] for _ in range(8)])
-        
-        sq_points = sq_points + sq_dirs # move in each direction
-        sq_valid = np.array([False for _ in range(8)])
-
-        #print(x,y)
-        #print(sq_points)
-
-        # if opponent in that direction
-        for i, sq in enumerate(sq_points):
-            if sq[0] < 0 or sq[1] < 0 or sq[0] >= 8 or sq[1] >= 8:
-                continue
-            if self.get_piece(sq[0], sq[1]) == self.get_opp():
-                sq_valid[i] = True
-
-        if not np.any(sq_valid):
-            return False
+    def unmake_move(self, undo):
+        move, flips, prev, turn, blackpass, whitepass, self.hash = undo
+        if move:
+            for sq in flips:
+                self.board[sq[0], sq[1]] = -turn
+            self.board[move[0], move[1]] = prev
+            self.update_frontier(move[0], move[1])
+            counts = self.counts
+            counts[turn] -= len(flips) + 1
+            counts[-turn] += len(flips)
+            counts[0] += 1
+            flipped = 0
+            for sq in flips:
+                flipped |= 1 << (8*sq[1] + sq[0])
+            placed = 1 << (8*move[1] + move[0])
+            bits = self.bits
+            bits[turn] &= ~(flipped | placed)
+            bits[-turn] |= flipped
+            bits[prev] |= placed
+        self.turn = turn
+        self.blackpass = blackpass
+        self.whitepass = whitepass
 
-        while True:
-            sq_points = sq_points + sq_dirs # move in each direction
-
-            # if opponent in that direction
-            for i, sq in enumerate(sq_points):
-                if sq[0] < 0 or sq[1] < 0 or sq[0] >= 8 or sq[1] >= 8 or not sq_valid[i]:
-                    sq_valid[i] = False
-                    continue
-                if self.get_piece(sq[0], sq[1]) == self.get_opp():
-                    sq_valid[i] = True
-                elif self.get_piece(sq[0], sq[1]) == self.get_turn() and sq_valid[i]:
-                    return True
-                else:
-                    sq_valid[i] = False
-            if not np.any(sq_valid):
-                return False
-            
+    def is_valid(self, x, y, player=None):
+        # go in each direction while there are opponent discs; valid if one of
+        # the rays ends on our own disc. player defaults to the one to move
+        board = self.board
+        if board[x, y] != 0:
+            return False
+        turn = self.turn if player is None else player
+        opp = -turn
+        for ray in RAYS[8*y + x]:
+            for n, (i, j) in enumerate(ray):
+                piece = board[i, j]
+                if piece != opp:
+                    if piece == turn and n:
+                        return True
+                    break
         return False
 
+    def get_flips(self, x, y):
+        # the discs a move at (x, y) would flip
+        board = self.board
+        turn = self.turn
+        opp = -turn
+        flips = []
+        for ray in RAYS[8*y + x]:
+            for n, (i, j) in enumerate(ray):
+                piece = board[i, j]
+                if piece != opp:
+                    if piece == turn:
+                        flips.extend(ray[:n])
+                    break
+        return flips
 
     def print_board(self):
         print('+-----------------+')
@@ -142,17 +171,89 @@ class Othello:
             print(string)
         print('+-----------------+')
 
+    def has_moves(self, player):
+        # whether player has a legal move, whoever is to move; stops at the first
+        bits = self.frontier
+        while bits:
+            low = bits & -bits
+            bits ^= low
+            sq = low.bit_length() - 1
+            if self.is_valid(sq & 7, sq >> 3, player):
+                return True
+        return False
+
+    def count_moves(self, player):
+        # the number of legal moves player has, whoever is to move; unlike
+        # get_moves this builds no list and leaves the pass flags alone
+        return get_moves_bb(self.bits[player], self.bits[-player]).bit_count()
+
+    def count_potential_moves(self, player):
+        # potential mobility: the empty squares next to an opponent disc,
+        # where player might get a move later
+        return get_potential_moves_bb(self.bits[player], self.bits[-player]).bit_count()
+
     def terminal(self):
-        passes = self.blackpass and self.whitepass
-        full = np.where(self.board == 0)[0].size == 0
-        return passes or full
+        # the game is over once the board is full or neither player can move
+        return self.counts[0] == 0 or not self.has_moves(self.turn) and not self.has_moves(-self.turn)
 
     def add_piece(self, p, x, y):
+        old = self.board[x, y]
+        if old != 0:
+            self.hash ^= ZOBRIST[old][8*y + x]
+        if p != 0:
+            self.hash ^= ZOBRIST[p][8*y + x]
         self.board[x, y] = p
+        self.counts[old] -= 1
+        self.counts[p] += 1
+        bit = 1 << (8*y + x)
+        self.bits[old] &= ~bit
+        self.bits[p] |= bit
+        if (old == 0) != (p == 0):
+            self.update_frontier(x, y)
+
+    def update_frontier(self, x, y):
+        # (x, y) was just filled or emptied
+        sq = 8*y + x
+        if self.board[x, y] != 0:
+            self.occupied |= 1 << sq
+            self.frontier = (self.frontier | NEIGHBORS[sq]) & ~self.occupied
+            return
+        self.occupied &= ~(1 << sq)
+        # the emptied square and its empty neighbours are frontier squares
+        # only if they still touch a disc
+        bits = (NEIGHBORS[sq] | 1 << sq) & ~self.occupied
+        while bits:
+            low = bits & -bits
+            bits ^= low
+            if NEIGHBORS[low.bit_length() - 1] & self.occupied:
+                self.frontier |= low
+            else:
+                self.frontier &= ~low
 
     def flip_piece(self, x, y):
         if self.get_piece(x, y) != 0:
-            self.board[x, y] = self.get_turn()
+            self.add_piece(self.get_turn(), x, y)
+
+    def get_hash(self):
+        key = self.hash
+        if self.turn == self.white:
+            key ^= ZOBRIST_TURN
+        if self.blackpass:
+            key ^= ZOBRIST_BLACKPASS
+        if self.whitepass:
+            key ^= ZOBRIST_WHITEPASS
+        return key
+
+    def get_canonical(self):
+        # (black bits, white bits, transform) of the smallest of the 8
+        # symmetric boards; see symmetry.py
+        return canonical_bits(self.bits[self.black], self.bits[self.white])
+
+    def get_canonical_hash(self):
+        # get_hash of the canonical board, the same for all 8 symmetric
+        # positions, and the transform that gives it
+        black, white, t = self.get_canonical()
+        return self.get_hash() ^ self.hash ^ bits_hash(black, white), t
 
     def get_piece(self, x, y):
         return self.board[x, y]
@@ -161,33 +262,43 @@ class Othello:
         return self.turn
 
     def get_num_black(self):
-        return np.where(self.board == self.black)[0].size
+        return self.counts[self.black]
     
     def get_num_white(self):
-        return np.where(self.board == self.white)[0].size
+        return self.counts[self.white]
+
+    def get_num_empty(self):
+        return self.counts[0]
+
+    def get_leader(self):
+        # the player with more discs, 0 if even; the winner once the game is over
+        num_black = self.counts[self.black]
+        num_white = self.counts[self.white]
+        if num_black > num_white:
+            return self.black
+        elif num_white > num_black:
+            return self.white
+        else:
+            return 0
 
     def get_winner(self):
         if not self.terminal():
             return 0
-        else:
-            num_black = self.get_num_black()
-            num_white = self.get_num_white()
-            if num_black > num_white:
-                return self.black
-            elif num_white > num_black:
-                return self.white
-            else:
-                return 0
+        return self.get_leader()
     
     def get_opp(self):
         return -self.turn
 
 
-
 def main():
+    # imported here because minimax imports this module
+    from minimax import get_computer_move
+    from records import write_transcript
     env = Othello()
+    moves = []
     while( not env.terminal() ):
         move = get_computer_move(env, 6)
+        moves.append(move)
         # moves = env.get_moves()
         # print(moves)
         # if moves:
@@ -197,6 +308,7 @@ def main():
         env.make_move(move)
         env.print_board()
     print(env.get_winner())
+    print(write_transcript(moves))
 
 if __name__ == '__main__':
     main()
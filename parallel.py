@@ -0,0 +1,89 @@
+from minimax import Search, negamax, order_tt_move
+from evalcache import EvalCache
+from position import Position
+import minimax
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import multiprocessing
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# best root value found so far, shared by every worker in the pool
+_shared_alpha = None
+
+
+def init_worker(shared_alpha):
+    global _shared_alpha
+    _shared_alpha = shared_alpha
+    # each worker fills a cache of its own, starting empty
+    if minimax.EVAL_CACHE is not None:
+        minimax.EVAL_CACHE = EvalCache(minimax.EVAL_CACHE.max_entries)
+
+def search_root_move(position, cls, move, max_depth, batch):
+    # runs in a worker: search one root move with the best value found so far
+    # as alpha. returns (value, exact, states examined)
+    search = Search(batch=batch)
+    alpha = _shared_alpha.value
+    env = position.to_env(cls)
+    env.make_move(move)
+    value = -negamax(env, float('-inf'), -alpha, 1, max_depth, search)
+    exact = value > alpha or alpha == float('-inf')
+    if value == alpha and not exact:
+        # may only be a bound, and it ties the best so far, so get the real value
+        value = -negamax(env, float('-inf'), float('inf'), 1, max_depth, search)
+        exact = True
+    if exact:
+        with _shared_alpha.get_lock():
+            if value > _shared_alpha.value:
+                _shared_alpha.value = value
+    return value, exact, search.stats.nodes
+
+
+class ParallelSearch:
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.shared_alpha = multiprocessing.Value('d', float('-inf'))
+        self.executor = ProcessPoolExecutor(self.workers, initializer=init_worker, initargs=(self.shared_alpha,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown()
+
+    def get_move(self, env, max_depth=4, tt=None, batch=None):
+        # root moves go to the workers in the same order the sequential search
+        # tries them, and ties go to the earlier move, so the result matches
+        # get_computer_move at the same depth
+        start = time.time()
+        moves = env.get_moves()
+        if not moves:
+            return None
+        if tt is not None:
+            entry = tt.probe(env.get_hash())
+            if entry:
+                order_tt_move(moves, entry[3])
+        self.shared_alpha.value = float('-inf')
+        # positions pickle in a few dozen bytes, boards in hundreds
+        position = Position.from_env(env)
+        futures = [self.executor.submit(search_root_move, position, type(env), move, max_depth, batch) for move in moves]
+        results = [future.result() for future in futures]
+        value = max(v for v, exact, _ in results if exact)
+        best_move = None
+        for move, (v, exact, _) in zip(moves, results):
+            if exact and v == value:
+                best_move = move
+                break
+        num_states = 1 + sum(n for _, _, n in results)
+        end = time.time()
+        logger.info(f'num states examined: {num_states:,d}; depth: {max_depth}; workers: {self.workers}; max value: {value:,.0f}; seconds elapsed: {end - start:,.2f}')
+        return best_move
+
+def get_parallel_move(env, max_depth=4, workers=None, batch=None):
+    with ParallelSearch(workers) as search:
+        return search.get_move(env, max_depth, batch=batch)
@@ -0,0 +1,211 @@
+from bitboard import BitboardOthello, get_env_bits
+from batch import popcount, U64
+from records import PositionDatabase, training_arrays
+from symmetry import transform_square
+from concurrent.futures import ProcessPoolExecutor
+import minimax
+import argparse
+import random
+import time
+import numpy as np
+
+# a pattern evaluator scores a position as the sum of one table entry per
+# pattern instance, plus a bias, with separate tables for each game phase. a
+# pattern's table is indexed by the base-3 code of its squares (0 empty, 1 a
+# disc of the player being scored, 2 an opponent disc). every pattern is used
+# in all of its symmetric placements and reading orders, sharing one table,
+# so the score is the same for all 8 symmetric positions. scores are in discs:
+# the weights are fitted to final disc differentials
+PATTERNS = (
+    ('edge+2x', [(x, 0) for x in range(8)] + [(1, 1), (6, 1)]),
+    ('corner3x3', [(x, y) for y in range(3) for x in range(3)]),
+    ('corner2x5', [(x, y) for y in range(2) for x in range(5)]),
+    ('diag8', [(i, i) for i in range(8)]),
+    ('diag7', [(i, i + 1) for i in range(7)]),
+    ('diag6', [(i, i + 2) for i in range(6)]),
+    ('diag5', [(i, i + 3) for i in range(5)]),
+    ('diag4', [(i, i + 4) for i in range(4)]),
+)
+NUM_PHASES = 6 # by number of discs on the board
+
+
+def _instances():
+    # (pattern index, squares) for every distinct placement and reading order
+    instances = []
+    for k, (_, squares) in enumerate(PATTERNS):
+        seen = set()
+        for t in range(8):
+            placed = tuple(transform_square(8*y + x, t) for x, y in squares)
+            if placed not in seen:
+                seen.add(placed)
+                instances.append((k, placed))
+    return instances
+
+_offsets = np.cumsum([0] + [3 ** len(squares) for _, squares in PATTERNS])
+TABLE_SIZE = int(_offsets[-1]) # entries per phase, before the bias
+INSTANCES = _instances()
+INSTANCE_OFFSETS = np.array([_offsets[k] for k, _ in INSTANCES])
+
+def _code_matrix():
+    # base-3 codes are linear in the square digits, so one matrix product gives
+    # every instance's code: CODE_MATRIX[sq, i] is 3**k when sq is instance i's kth square
+    matrix = np.zeros((64, len(INSTANCES)))
+    for i, (_, squares) in enumerate(INSTANCES):
+        for k, sq in enumerate(squares):
+            matrix[sq, i] = 3 ** k
+    return matrix
+
+CODE_MATRIX = _code_matrix()
+
+
+def get_features(p, o):
+    # table indices for arrays of N (player, opponent) bitboards: returns
+    # (N, instances + 1) indices into a phase's weights, the last being the bias
+    p = np.atleast_1d(np.asarray(p, dtype=U64))
+    o = np.atleast_1d(np.asarray(o, dtype=U64))
+    n = len(p)
+    bits = np.unpackbits(np.stack([p, o], axis=1).astype('<u8').view(np.uint8).reshape(n, 16), axis=1, bitorder='little')
+    digits = bits[:, :64] + 2.0 * bits[:, 64:]
+    features = np.empty((n, len(INSTANCES) + 1), dtype=np.int64)
+    features[:, :-1] = digits @ CODE_MATRIX + INSTANCE_OFFSETS
+    features[:, -1] = TABLE_SIZE
+    return features
+
+def get_phases(p, o):
+    discs = popcount(np.atleast_1d(np.asarray(p, dtype=U64)) | np.atleast_1d(np.asarray(o, dtype=U64)))
+    return np.clip((discs - 4) * NUM_PHASES // 60, 0, NUM_PHASES - 1)
+
+
+class PatternEvaluator:
+    def __init__(self, weights=None):
+        if weights is None:
+            weights = np.zeros((NUM_PHASES, TABLE_SIZE + 1), dtype=np.float32)
+        if weights.shape != (NUM_PHASES, TABLE_SIZE + 1):
+            raise ValueError(f'pattern weights should have shape {(NUM_PHASES, TABLE_SIZE + 1)}, not {weights.shape}')
+        self.weights = weights
+
+    @classmethod
+    def load(cls, path):
+        return cls(np.load(path))
+
+    def save(self, path):
+        np.save(path, self.weights)
+
+    def evaluate_bits(self, p, o):
+        # scores for arrays of (player, opponent) bitboards, from the player's side
+        features = get_features(p, o)
+        phases = get_phases(p, o)
+        return self.weights[phases[:, None], features].sum(axis=1, dtype=np.float64)
+
+    def evaluate(self, max_player, env):
+        # drop-in for minimax.heuristic
+        p, o = get_env_bits(env, max_player)
+        return float(self.evaluate_bits(p, o)[0])
+
+    def evaluate_batch(self, max_player, black, white):
+        # drop-in for batch.heuristic_batch given bitboards
+        black = np.asarray(black, dtype=U64)
+        white = np.asarray(white, dtype=U64)
+        max_is_black = np.broadcast_to(np.asarray(max_player) == 1, black.shape)
+        return self.evaluate_bits(np.where(max_is_black, black, white), np.where(max_is_black, white, black))
+
+
+# training: self-play games, labelled with the final disc differential
+
+def play_game(game):
+    # runs in a worker: a game between two copies of the hand-tuned search,
+    # with some random moves for variety. returns the moves, None for a pass
+    seed, depth, epsilon, endgame_empties = game
+    rng = random.Random(seed)
+    env = BitboardOthello()
+    moves = []
+    while not env.terminal():
+        legal = env.get_moves()
+        if not legal:
+            move = None
+        elif len(moves) < 4 or rng.random() < epsilon:
+            move = rng.choice(legal)
+        else:
+            move = minimax.get_computer_move(env, depth, endgame_empties=endgame_empties)
+        env.make_move(move)
+        moves.append(move)
+    return moves
+
+def generate_games(num_games, depth=2, epsilon=0.1, endgame_empties=8, seed=0, workers=None):
+    games = [(seed + i, depth, epsilon, endgame_empties) for i in range(num_games)]
+    with ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(play_game, games, chunksize=4))
+
+def training_positions(games):
+    # (player to move bits, opponent bits, final disc differential for the
+    # player to move) for every position of every game
+    players, opponents, targets = [], [], []
+    for moves in games:
+        env = BitboardOthello()
+        movers = []
+        for move in moves:
+            p, o = env.get_bits()
+            players.append(p)
+            opponents.append(o)
+            movers.append(env.turn)
+            env.make_move(move)
+        score = env.get_num_black() - env.get_num_white()
+        targets.extend(score * mover for mover in movers)
+    return np.array(players, dtype=U64), np.array(opponents, dtype=U64), np.array(targets, dtype=np.float64)
+
+def fit(p, o, targets, epochs=300, rate=0.5, l2=1.0, verbose=True):
+    # least squares by full-batch gradient descent: each step moves every
+    # weight by the mean residual of the positions that use it, scaled down by
+    # the number of weights each position uses. l2 pulls rarely seen entries to 0
+    features = get_features(p, o)
+    index = (get_phases(p, o) * (TABLE_SIZE + 1))[:, None] + features
+    flat_index = index.ravel()
+    size = NUM_PHASES * (TABLE_SIZE + 1)
+    counts = np.bincount(flat_index, minlength=size)
+    weights = np.zeros(size)
+    step = rate / features.shape[1]
+    for epoch in range(epochs):
+        residual = weights[index].sum(axis=1) - targets
+        grad = np.bincount(flat_index, weights=np.repeat(residual, features.shape[1]), minlength=size)
+        weights -= step * (grad + l2 * weights) / (counts + l2)
+        if verbose and (epoch % 50 == 0 or epoch == epochs - 1):
+            print(f'epoch {epoch}: rms error {np.sqrt(np.mean(residual ** 2)):,.2f} discs')
+    return PatternEvaluator(weights.reshape(NUM_PHASES, TABLE_SIZE + 1).astype(np.float32))
+
+def rms_error(evaluator, p, o, targets):
+    return float(np.sqrt(np.mean((evaluator.evaluate_bits(p, o) - targets) ** 2)))
+
+def main():
+    parser = argparse.ArgumentParser(description='train pattern weights from self-play')
+    parser.add_argument('--games', type=int, default=200)
+    parser.add_argument('--depth', type=int, default=2, help='search depth of the self-play games')
+    parser.add_argument('--epsilon', type=float, default=0.1, help='chance of a random move')
+    parser.add_argument('--epochs', type=int, default=300)
+    parser.add_argument('--l2', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--db', help='train on the games of this position database (see records.py) instead of self-play')
+    parser.add_argument('--out', default='patterns.npy')
+    args = parser.parse_args()
+
+    # hold out every tenth game to check the fit generalizes
+    if args.db:
+        with PositionDatabase(args.db) as db:
+            positions = np.array(db.positions)
+        held_out = positions['game'] % 10 == 0
+        train = training_arrays(positions[~held_out])
+        test = training_arrays(positions[held_out])
+    else:
+        start = time.time()
+        games = generate_games(args.games, args.depth, args.epsilon, seed=args.seed, workers=args.workers)
+        print(f'{len(games):,d} games in {time.time() - start:,.1f} seconds')
+        train = training_positions([g for i, g in enumerate(games) if i % 10])
+        test = training_positions(games[::10])
+    evaluator = fit(*train, epochs=args.epochs, l2=args.l2)
+    print(f'{len(train[0]):,d} training positions; rms error: train {rms_error(evaluator, *train):,.2f}; '
+          f'held out {rms_error(evaluator, *test):,.2f} discs')
+    evaluator.save(args.out)
+    print(f'weights in {args.out}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+from othello import Othello, ZOBRIST_TURN, ZOBRIST_BLACKPASS, ZOBRIST_WHITEPASS, bits_hash
+from bitboard import BitboardOthello, bits_to_array, get_env_bits, get_moves_bb, get_flips_bb, iter_squares, square, square_to_move
+from symmetry import transform_bits
+import struct
+import numpy as np
+
+# a position in 17 bytes: the black and white bitboards and one byte of flags.
+# positions are never changed once made, so sharing one is as good as copying
+# it; play returns a new position. to_env gives back a full board to search
+WHITE_TO_MOVE = 1
+BLACK_PASSED = 2
+WHITE_PASSED = 4
+ENCODING = struct.Struct('<QQB') # black, white, flags
+START_BLACK = (1 << square(3, 4)) | (1 << square(4, 3))
+START_WHITE = (1 << square(3, 3)) | (1 << square(4, 4))
+
+
+class Position:
+    __slots__ = ('black', 'white', 'flags')
+
+    def __init__(self, black=START_BLACK, white=START_WHITE, flags=0):
+        self.black = black
+        self.white = white
+        self.flags = flags
+
+    @classmethod
+    def from_env(cls, env):
+        # from an Othello or a BitboardOthello
+        black, white = get_env_bits(env, env.black)
+        flags = (WHITE_TO_MOVE if env.turn == env.white else 0) | (BLACK_PASSED if env.blackpass else 0) | (WHITE_PASSED if env.whitepass else 0)
+        return cls(black, white, flags)
+
+    def to_env(self, cls=Othello):
+        # a board of class cls (Othello or BitboardOthello) in this position,
+        # pass flags and hash included
+        if cls is BitboardOthello:
+            env = BitboardOthello()
+            env.black_bits, env.white_bits = self.black, self.white
+            env.hash = bits_hash(self.black, self.white)
+        else:
+            env = cls()
+            # add_piece keeps the hash and the frontier up to date, so it does
+            # the squares that differ from the start position
+            board = bits_to_array(self.black).astype(np.int16) - bits_to_array(self.white).astype(np.int16)
+            for x, y in np.argwhere(board != env.board).tolist():
+                env.add_piece(int(board[x, y]), x, y)
+        env.turn = self.turn
+        env.blackpass = self.blackpass
+        env.whitepass = self.whitepass
+        return env
+
+    def transform(self, t):
+        # the position with its discs put through symmetry t (see symmetry.py)
+        return Position(transform_bits(self.black, t), transform_bits(self.white, t), self.flags)
+
+    def to_bytes(self):
+        return ENCODING.pack(self.black, self.white, self.flags)
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(*ENCODING.unpack(data))
+
+    def clone(self):
+        new = Position.__new__(Position)
+        new.black = self.black
+        new.white = self.white
+        new.flags = self.flags
+        return new
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        # pickles smaller than going through to_bytes
+        return Position, (self.black, self.white, self.flags)
+
+    def __eq__(self, other):
+        return isinstance(other, Position) and self.black == other.black and self.white == other.white and self.flags == other.flags
+
+    def __hash__(self):
+        return hash((self.black, self.white, self.flags))
+
+    def __repr__(self):
+        return f'Position({self.black:#018x}, {self.white:#018x}, {self.flags})'
+
+    @property
+    def turn(self):
+        return -1 if self.flags & WHITE_TO_MOVE else 1
+
+    @property
+    def blackpass(self):
+        return bool(self.flags & BLACK_PASSED)
+
+    @property
+    def whitepass(self):
+        return bool(self.flags & WHITE_PASSED)
+
+    def get_bits(self):
+        # (player to move, opponent)
+        if self.flags & WHITE_TO_MOVE:
+            return self.white, self.black
+        return self.black, self.white
+
+    def get_hash(self):
+        # the same key as the boards' get_hash
+        key = bits_hash(self.black, self.white)
+        if self.flags & WHITE_TO_MOVE:
+            key ^= ZOBRIST_TURN
+        if self.flags & BLACK_PASSED:
+            key ^= ZOBRIST_BLACKPASS
+        if self.flags & WHITE_PASSED:
+            key ^= ZOBRIST_WHITEPASS
+        return key
+
+    def get_moves(self):
+        # the legal moves, None when the player to move has to pass; unlike
+        # the boards' get_moves this leaves the pass flags alone
+        moves = [square_to_move(sq) for sq in iter_squares(get_moves_bb(*self.get_bits()))]
+        return moves or None
+
+    def play(self, move):
+        # the position after move, None for a pass, with the pass flags a
+        # board has after make_move and then get_moves, as the game loops and
+        # the search play: a pass sets the flag of the player now to move,
+        # which stays set only if they have to pass too
+        flags = self.flags ^ WHITE_TO_MOVE
+        if not move:
+            new = Position(self.black, self.white, flags | (WHITE_PASSED if flags & WHITE_TO_MOVE else BLACK_PASSED))
+            if get_moves_bb(*new.get_bits()):
+                new.flags &= ~(WHITE_PASSED if flags & WHITE_TO_MOVE else BLACK_PASSED)
+            return new
+        sq = square(*move)
+        p, o = self.get_bits()
+        flips = get_flips_bb(p, o, sq)
+        p |= flips | (1 << sq)
+        o &= ~p
+        if self.flags & WHITE_TO_MOVE:
+            return Position(o, p, flags & ~WHITE_PASSED)
+        return Position(p, o, flags & ~BLACK_PASSED)
+
+def transform_env(env, t):
+    # a board of env's class in env's position put through symmetry t
+    return Position.from_env(env).transform(t).to_env(type(env))
+
+def same_position(a, b):
+    # whether two boards, of either class, hold the same discs, hash, turn and pass flags
+    return (np.array_equal(a.board, b.board) and a.get_hash() == b.get_hash() and a.turn == b.turn
+            and a.blackpass == b.blackpass and a.whitepass == b.whitepass)
@@ -0,0 +1,234 @@
+from othello import Othello, bits_hash
+from bitboard import BitboardOthello, square, square_to_move
+import argparse
+import random
+import struct
+import time
+import numpy as np
+
+# a game record is the list of moves from the start position, None for a pass.
+# as text it is the usual transcript of two characters a move, column letter
+# then row number: square (x, y) is "abcdefgh"[x] followed by y + 1, so a game
+# starts "f5d6c3...". a pass is forced whenever the player to move has no
+# move, so passes before a move are left out and put back when reading. a game
+# is over as soon as neither player can move; records from before that was
+# checked directly end with the two passes that used to end such a game,
+# which are written and read as "pa"
+COLUMNS = 'abcdefgh'
+PASS = 'pa'
+
+
+def move_to_text(move):
+    if move is None:
+        return PASS
+    return f'{COLUMNS[move[0]]}{move[1] + 1}'
+
+def text_to_move(text):
+    text = text.lower()
+    if text == PASS:
+        return None
+    if len(text) != 2 or text[0] not in COLUMNS or text[1] not in '12345678':
+        raise ValueError(f'not a move: {text!r}')
+    return (COLUMNS.index(text[0]), int(text[1]) - 1)
+
+def write_transcript(moves):
+    end = len(moves)
+    while end and moves[end - 1] is None:
+        end -= 1
+    return ''.join(move_to_text(move) for move in moves[:end] if move is not None) + PASS * (len(moves) - end)
+
+def read_transcript(text):
+    # the moves of a transcript with its passes put back; raises ValueError
+    # if a move isn't legal
+    text = ''.join(text.split())
+    if len(text) % 2:
+        raise ValueError(f'odd length transcript: {text!r}')
+    env = BitboardOthello()
+    moves = []
+    for i in range(0, len(text), 2):
+        move = text_to_move(text[i:i + 2])
+        if env.terminal():
+            if move is None and text[i:] == PASS * ((len(text) - i) // 2):
+                moves.append(None)
+                continue
+            raise ValueError(f'moves after the end of the game at move {i // 2 + 1}')
+        legal = env.get_moves()
+        if move is not None and not legal:
+            env.make_move(None)
+            moves.append(None)
+            legal = env.get_moves()
+        if (move is None) != (not legal) or move is not None and move not in legal:
+            raise ValueError(f'illegal move {text[i:i + 2]!r} at move {i // 2 + 1}')
+        env.make_move(move)
+        moves.append(move)
+    return moves
+
+def replay(moves, cls=Othello):
+    # the position after moves, reached the way the game loops play: asking
+    # for the legal moves before each one
+    env = cls()
+    for move in moves:
+        env.get_moves()
+        env.make_move(move)
+    env.get_moves()
+    return env
+
+def random_games(num_games, seed=0):
+    # move lists for a set of games played at random, the same ones for a seed
+    rng = random.Random(seed)
+    games = []
+    for _ in range(num_games):
+        env = Othello()
+        game = []
+        while not env.terminal():
+            moves = env.get_moves()
+            move = rng.choice(moves) if moves else None
+            env.make_move(move)
+            game.append(move)
+        games.append(game)
+    return games
+
+def write_games(path, games):
+    # one transcript per line
+    with open(path, 'w') as f:
+        for moves in games:
+            f.write(write_transcript(moves) + '\n')
+
+def read_games(path):
+    # the games of a file written by write_games, one at a time
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield read_transcript(line)
+
+
+# a position database is a header followed by fixed size records, one for the
+# position before every move of every game and one for each final position,
+# read through a memory map. passes holds bit 1 when black's pass flag is set
+# and bit 2 for white's; move is the square played from the position, -1 for a
+# pass and -2 at the end of the game; result is the final disc differential
+# for black. positions are stored after asking for the legal moves, as the
+# search sees them
+MAGIC = b'OTHPOS01'
+HEADER = struct.Struct('<8sQ') # magic, number of positions
+POSITION = np.dtype([
+    ('black', '<u8'), ('white', '<u8'), ('turn', 'i1'), ('passes', 'u1'),
+    ('move', 'i1'), ('ply', 'u1'), ('game', '<u4'), ('result', 'i1'),
+])
+MOVE_PASS = -1
+MOVE_END = -2
+
+
+def game_positions(moves, game=0):
+    env = BitboardOthello()
+    rows = []
+    for ply in range(len(moves) + 1):
+        env.get_moves()
+        if ply < len(moves):
+            move = moves[ply]
+            code = MOVE_PASS if move is None else square(*move)
+        else:
+            code = MOVE_END
+        rows.append((env.black_bits, env.white_bits, env.turn, env.blackpass | env.whitepass << 1, code, ply, game, 0))
+        if code != MOVE_END:
+            env.make_move(move)
+    positions = np.array(rows, dtype=POSITION)
+    positions['result'] = env.get_num_black() - env.get_num_white()
+    return positions
+
+def env_from_position(position, cls=Othello):
+    env = BitboardOthello()
+    env.black_bits, env.white_bits = int(position['black']), int(position['white'])
+    env.hash = bits_hash(env.black_bits, env.white_bits)
+    env.turn = int(position['turn'])
+    env.blackpass = bool(position['passes'] & 1)
+    env.whitepass = bool(position['passes'] & 2)
+    return env.to_othello() if cls is Othello else env
+
+def write_database(path, games):
+    # games is any iterable of move lists, consumed as it is written; returns
+    # the number of positions
+    count = 0
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, 0))
+        for game, moves in enumerate(games):
+            positions = game_positions(moves, game)
+            f.write(positions.tobytes())
+            count += len(positions)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, count))
+    return count
+
+
+class PositionDatabase:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+        magic, self.size = HEADER.unpack(header) if len(header) == HEADER.size else (None, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a position database')
+        if self.size:
+            self.positions = np.memmap(path, dtype=POSITION, mode='r', offset=HEADER.size, shape=(self.size,))
+        else:
+            self.positions = np.empty(0, dtype=POSITION)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        return self.positions[index]
+
+    def close(self):
+        # the map closes once nothing refers to it
+        self.positions = None
+
+    def batches(self, size=65536):
+        # consecutive slices of at most size positions, read into memory one at a time
+        for start in range(0, self.size, size):
+            yield np.array(self.positions[start:start + size])
+
+    def envs(self, cls=Othello):
+        # every position as a board, e.g. to score with minimax.heuristic or search
+        for batch in self.batches():
+            for position in batch:
+                yield env_from_position(position, cls)
+
+    def games(self):
+        # the move lists the database was written from
+        moves = []
+        for batch in self.batches():
+            for code in batch['move'].tolist():
+                if code == MOVE_END:
+                    yield moves
+                    moves = []
+                else:
+                    moves.append(None if code == MOVE_PASS else square_to_move(code))
+
+def training_arrays(positions):
+    # (player to move bits, opponent bits, final disc differential for the
+    # player to move) for every position a move was played from
+    positions = positions[positions['move'] != MOVE_END]
+    black_to_move = positions['turn'] == 1
+    p = np.where(black_to_move, positions['black'], positions['white'])
+    o = np.where(black_to_move, positions['white'], positions['black'])
+    return p, o, positions['result'] * positions['turn'].astype(np.float64)
+
+def main():
+    parser = argparse.ArgumentParser(description='convert a file of game transcripts to a position database')
+    parser.add_argument('games', help='one transcript per line')
+    parser.add_argument('--out', default='positions.db')
+    args = parser.parse_args()
+
+    start = time.time()
+    count = write_database(args.out, read_games(args.games))
+    print(f'{count:,d} positions in {time.time() - start:,.1f} seconds; database in {args.out}')
+
+if __name__ == '__main__':
+    main()
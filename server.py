@@ -0,0 +1,267 @@
+from othello import Othello
+from bitboard import get_env_bits
+from records import read_transcript, replay, move_to_text, env_from_position
+from transposition import TranspositionTable
+from ordering import MoveOrdering
+from book import OpeningBook
+from patterns import PatternEvaluator
+from concurrent.futures import ProcessPoolExecutor
+import minimax
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import sys
+
+logger = logging.getLogger(__name__)
+
+# the server speaks json lines over tcp or stdin/stdout. a request gives a
+# position, either as the moves from the start ("moves": "f5d6c3", see
+# records.py) or as its discs ("black" and "white" bitboards with square (x, y)
+# at bit 8*y + x, and "turn", 1 for black), and a budget: "depth", "time" in
+# seconds, or both. an "id" is echoed back. the reply has "move" ("c4", or
+# "pa" when the player to move must pass), "value", "depth", "nodes", "source"
+# and "seconds", or else "error". a connection's replies come back as their
+# searches finish, not necessarily in the order asked. {"stats": true} asks
+# for the server's counters
+DEFAULT_DEPTH = 4 # when a request gives no budget
+MAX_DEPTH = 12
+MAX_TIME = 60
+
+# search state kept by each worker process between requests
+_tt = None
+_ordering = None
+_book = None
+
+
+def init_worker(tt_size_mb, book_path, patterns_path):
+    global _tt, _ordering, _book
+    _tt = TranspositionTable(tt_size_mb)
+    _ordering = MoveOrdering()
+    _book = OpeningBook(book_path) if book_path and os.path.exists(book_path) else None
+    if patterns_path and os.path.exists(patterns_path):
+        minimax.EVALUATOR = PatternEvaluator.load(patterns_path)
+
+def analyze(black, white, turn, passes, depth, time_limit):
+    # runs in a worker: the reply to one search, without its id
+    env = env_from_position({'black': black, 'white': white, 'turn': turn, 'passes': passes}, Othello)
+    if env.terminal():
+        raise ValueError('the game is over')
+    env.get_moves()
+    move, stats = minimax.find_move(env, depth, tt=_tt, ordering=_ordering, book=_book, time_limit=time_limit)
+    record = stats.to_dict()
+    return {
+        'move': move_to_text(move),
+        'value': record['value'],
+        'depth': stats.depth,
+        'nodes': stats.nodes,
+        'source': stats.source,
+        'seconds': round(stats.seconds, 6),
+    }
+
+def parse_request(request):
+    # the arguments to analyze for a request; identical requests give equal
+    # tuples, which is what coalescing goes by. raises ValueError
+    if not isinstance(request, dict):
+        raise ValueError('a request is a json object')
+    if 'moves' in request:
+        if not isinstance(request['moves'], str):
+            raise ValueError('"moves" should be a transcript string')
+        env = replay(read_transcript(request['moves']), Othello)
+        position = (*get_env_bits(env, env.black), env.turn, env.blackpass | env.whitepass << 1)
+    elif 'black' in request and 'white' in request:
+        black, white, turn = request['black'], request['white'], request.get('turn', 1)
+        # int() would quietly truncate 1.5 or parse "12"; json true is an int to python
+        if not all(isinstance(value, int) and not isinstance(value, bool) for value in (black, white, turn)):
+            raise ValueError('not a position')
+        if not (0 <= black < 2**64 and 0 <= white < 2**64) or black & white or turn not in (1, -1):
+            raise ValueError('not a position')
+        position = (black, white, turn, 0)
+    else:
+        raise ValueError('a request needs "moves", or "black" and "white"')
+    depth = request.get('depth')
+    time_limit = request.get('time')
+    if depth is None and time_limit is None:
+        depth = DEFAULT_DEPTH
+    if depth is not None and not 1 <= int(depth) <= MAX_DEPTH:
+        raise ValueError(f'depth should be from 1 to {MAX_DEPTH}')
+    if time_limit is not None and not 0 < float(time_limit) <= MAX_TIME:
+        raise ValueError(f'time should be over 0 and at most {MAX_TIME} seconds')
+    return (*position, None if depth is None else int(depth), None if time_limit is None else float(time_limit))
+
+
+class EngineServer:
+    # requests wait in a queue for one of the worker processes; a request
+    # for a position and budget that is already queued or being searched
+    # waits for that search instead of starting another
+    def __init__(self, workers=None, tt_size_mb=64, book_path=None, patterns_path=None):
+        self.workers = workers or os.cpu_count() or 1
+        # workers start when the first searches arrive; forked then, they
+        # would inherit the open client sockets and keep them from closing
+        self.executor = ProcessPoolExecutor(self.workers, multiprocessing.get_context('spawn'), initializer=init_worker,
+                                            initargs=(tt_size_mb, book_path, patterns_path))
+        self.queue = asyncio.Queue()
+        self.pending = {} # parse_request tuple -> future of its reply
+        self.dispatchers = []
+        self.connections = set() # tasks handling open connections
+        self.requests = 0
+        self.searches = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def start(self):
+        # one dispatcher per worker, so a search is only sent once a worker is free
+        self.dispatchers = [asyncio.create_task(self.dispatch()) for _ in range(self.workers)]
+
+    async def close(self):
+        # give connections whose clients have hung up a moment to finish
+        if self.connections:
+            await asyncio.wait(self.connections, timeout=1)
+        for task in self.dispatchers:
+            task.cancel()
+        await asyncio.gather(*self.dispatchers, return_exceptions=True)
+        self.executor.shutdown()
+
+    async def dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            key, future = await self.queue.get()
+            try:
+                reply = await loop.run_in_executor(self.executor, analyze, *key)
+            except ValueError as e:
+                reply = {'error': str(e)}
+            except Exception as e:
+                logger.exception('search failed')
+                reply = {'error': f'search failed: {e}'}
+            del self.pending[key]
+            self.searches += 1
+            future.set_result(reply)
+
+    async def analyze(self, request):
+        # the reply to one request
+        self.requests += 1
+        try:
+            key = parse_request(request)
+        except (ValueError, TypeError) as e:
+            reply = {'error': str(e)}
+        else:
+            future = self.pending.get(key)
+            if future is None:
+                future = asyncio.get_running_loop().create_future()
+                self.pending[key] = future
+                self.queue.put_nowait((key, future))
+            else:
+                self.coalesced += 1
+            # shielded so a client going away doesn't cancel the search for the others waiting on it
+            reply = dict(await asyncio.shield(future))
+        if 'error' in reply:
+            self.errors += 1
+        if isinstance(request, dict) and 'id' in request:
+            reply['id'] = request['id']
+        return reply
+
+    def stats(self):
+        return {'requests': self.requests, 'searches': self.searches, 'coalesced': self.coalesced, 'errors': self.errors,
+                'queued': self.queue.qsize(), 'workers': self.workers}
+
+    async def answer(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            self.requests += 1
+            self.errors += 1
+            return {'error': 'not json'}
+        if isinstance(request, dict) and request.get('stats'):
+            return self.stats()
+        return await self.analyze(request)
+
+    async def handle(self, reader, writer):
+        # one connection: every line is answered as soon as its search is done
+        lock = asyncio.Lock()
+        tasks = set()
+        connection = asyncio.current_task()
+        self.connections.add(connection)
+
+        async def reply_to(line):
+            try:
+                reply = await self.answer(line)
+            except Exception as e:
+                # whatever went wrong, the client still gets a reply
+                logger.exception('bad request')
+                self.errors += 1
+                reply = {'error': f'bad request: {e}'}
+            async with lock:
+                writer.write((json.dumps(reply) + '\n').encode())
+                await writer.drain()
+
+        while line := await reader.readline():
+            if line.strip():
+                task = asyncio.create_task(reply_to(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        # the client has stopped sending; finish what it asked for
+        await asyncio.gather(*tasks, return_exceptions=True)
+        writer.close()
+        self.connections.discard(connection)
+
+async def serve_tcp(server, host, port):
+    tcp = await asyncio.start_server(server.handle, host, port)
+    async with tcp:
+        logger.info(f'serving on {", ".join(str(s.getsockname()) for s in tcp.sockets)} with {server.workers} workers')
+        await tcp.serve_forever()
+
+class StdioStream:
+    # stdin and stdout as the reader and writer handle() takes. reads block in
+    # a thread, so stdin can be a pipe, a file or a terminal
+    async def readline(self):
+        return await asyncio.get_running_loop().run_in_executor(None, sys.stdin.buffer.readline)
+
+    def write(self, data):
+        sys.stdout.buffer.write(data)
+
+    async def drain(self):
+        sys.stdout.buffer.flush()
+
+    def close(self):
+        sys.stdout.buffer.flush()
+
+async def serve_stdio(server):
+    stream = StdioStream()
+    await server.handle(stream, stream)
+
+async def run(args):
+    async with EngineServer(args.workers, args.tt_size, args.book, args.patterns) as server:
+        if args.stdio:
+            await serve_stdio(server)
+        else:
+            await serve_tcp(server, args.host, args.port)
+
+def main():
+    parser = argparse.ArgumentParser(description='serve searches as json lines over tcp or stdin/stdout')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--stdio', action='store_true', help='read requests from stdin and reply on stdout')
+    parser.add_argument('--workers', type=int, default=None, help='search processes, one per cpu by default')
+    parser.add_argument('--tt-size', type=int, default=64, help='transposition table megabytes per worker')
+    parser.add_argument('--book', default='book.bin')
+    parser.add_argument('--patterns', default='patterns.npy')
+    parser.add_argument('--verbose', action='store_true', help='log every search to stderr')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format='%(message)s')
+    logger.setLevel(logging.INFO)
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
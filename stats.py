@@ -0,0 +1,127 @@
+import json
+import math
+import os
+import time
+
+# what a search did, returned with its move by minimax.find_move. the counts
+# cost an increment per node and are always kept; the split of the time
+# between move generation, evaluation and making moves costs two clock reads
+# per call, so it is only measured when the search profiles
+
+
+class SearchStats:
+    def __init__(self, max_ply=128, max_moves=64):
+        self.source = 'search' # 'book', 'endgame' or 'search'
+        self.move = None
+        self.value = None # for the player to move
+        self.depth = 0 # the fixed depth, or the deepest finished iteration
+        self.pv = []
+        self.nodes_by_ply = [0] * (max_ply + 2)
+        self.solver_nodes = 0 # nodes of the endgame solver, which doesn't count by ply
+        self.leaf_evals = 0
+        self.cutoffs_by_index = [0] * max_moves # beta cutoffs by the index of the move that caused them
+        self.tt_probes = 0
+        self.tt_hits = 0 # probes that found an entry
+        self.tt_cutoffs = 0 # entries that settled their node without a search
+        self.times = {'movegen': 0.0, 'eval': 0.0, 'make': 0.0, 'copy': 0.0}
+        self.iterations = [] # one dict per finished iteration of iterative deepening
+        self.seconds = 0.0
+
+    def timed(self, key, func, *args):
+        # func(*args), with its time added to times[key]
+        start = time.perf_counter()
+        result = func(*args)
+        self.times[key] += time.perf_counter() - start
+        return result
+
+    @property
+    def nodes(self):
+        return sum(self.nodes_by_ply) + self.solver_nodes
+
+    @property
+    def cutoffs(self):
+        return sum(self.cutoffs_by_index)
+
+    @property
+    def nps(self):
+        return self.nodes / self.seconds if self.seconds > 0 else 0.0
+
+    def summary(self):
+        cutoffs = self.cutoffs
+        first = self.cutoffs_by_index[0] / cutoffs if cutoffs else 0
+        return (f'num states examined: {self.nodes:,d}; leaf evals: {self.leaf_evals:,d}; '
+                f'cutoffs: {cutoffs:,d} ({first:.1%} on the first move); '
+                f'tt probes: {self.tt_probes:,d}; nodes/sec: {self.nps:,.0f}')
+
+    def to_dict(self):
+        return {
+            'time': time.time(),
+            'source': self.source,
+            'move': None if self.move is None else list(self.move),
+            'value': _json_number(self.value),
+            'depth': self.depth,
+            'pv': [None if move is None else list(move) for move in self.pv],
+            'nodes': self.nodes,
+            'nodes_by_ply': _trim(self.nodes_by_ply),
+            'leaf_evals': self.leaf_evals,
+            'cutoffs_by_index': _trim(self.cutoffs_by_index),
+            'tt_probes': self.tt_probes,
+            'tt_hits': self.tt_hits,
+            'tt_cutoffs': self.tt_cutoffs,
+            'times': dict(self.times),
+            'iterations': [dict(iteration, value=_json_number(iteration['value'])) for iteration in self.iterations],
+            'seconds': self.seconds,
+            'nps': self.nps,
+        }
+
+def _trim(counts):
+    # drop the unused tail of a fixed size counter list
+    end = len(counts)
+    while end and not counts[end - 1]:
+        end -= 1
+    return counts[:end]
+
+def _json_number(value):
+    # json has no infinities, which are won and lost positions here
+    if value is None or math.isfinite(value):
+        return value
+    return 'inf' if value > 0 else '-inf'
+
+
+class SearchHooks:
+    # hooks are opt-in: the search calls them only when given a hooks object.
+    # subclass and override the ones needed
+    def on_search_start(self, env):
+        pass
+
+    def on_iteration(self, stats, iteration):
+        # after each finished iteration of iterative deepening
+        pass
+
+    def on_cutoff(self, ply, index, move):
+        # at every beta cutoff, so it is called often
+        pass
+
+    def on_search_end(self, stats):
+        pass
+
+class JsonLinesExporter(SearchHooks):
+    # appends each search's statistics to a file as one json object per line
+    def __init__(self, file):
+        # file is a path or an open text file
+        self.owned = isinstance(file, (str, os.PathLike))
+        self.file = open(file, 'a') if self.owned else file
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.owned:
+            self.file.close()
+
+    def on_search_end(self, stats):
+        self.file.write(json.dumps(stats.to_dict()) + '\n')
+        self.file.flush()
@@ -0,0 +1,247 @@
+from othello import Othello
+from bitboard import BitboardOthello
+from records import read_transcript, replay
+from transposition import TranspositionTable
+from ordering import MoveOrdering
+from endgame import solve_endgame
+from stats import SearchStats
+import minimax
+import argparse
+import json
+import platform
+import sys
+import time
+
+# a fixed set of measurements to run before and after a change: perft (move
+# generation and make/unmake), leaf evaluations per second with
+# minimax.heuristic, and nodes per second and time to each depth for the
+# search, over fixed opening, midgame and endgame positions. results are
+# written as json and can be compared with an earlier run saved as a
+# baseline; a metric that got worse by more than the threshold is a
+# regression. node counts don't depend on the machine, times do, so compare
+# runs made on the same one
+
+# perft(n) from the start position, counting a pass as a move and a finished
+# game as a single leaf
+PERFT_COUNTS = (1, 4, 12, 56, 244, 1396, 8200, 55092, 390216, 3005288, 24571284)
+
+# transcripts (see records.py) of games between shallow searches after a few
+# random moves: openings after 8 moves, midgames after 28 and endgames with 12
+# empty squares
+POSITION_SETS = {
+    'opening': (
+        'c4c5b6d3c2a7e6f6',
+        'c4c5f6c3b5g7d3a5',
+        'f5f6e6f4g6d7f3g4',
+        'f5f4f3f6d3f2g5c3',
+        'e6f6f5d6c5b4f7g5',
+        'e6f6g6d6c6g7f4b6',
+    ),
+    'midgame': (
+        'e6d6c3f4d7c5g3d8b5b4b6d2a3f6e7g4e3d3h4g5c4e8e1a5f8a4g6c7',
+        'd3c3b3e3f3c5d6f2f6a3d2e7c7c1d1e1f8d7b4f4g3g4g5h4d8b6b5a5',
+        'c4e3f2c5d6e2f4f5c6b5f6g5f3g3a5e6d7e7f7f8g4c7c8b6a6b3d3c3',
+        'd3e3f4c3c2d2d1c1b3c4b5g3f3b4f5g4h3e2a4e1f2g6f6h4f1d6c5a3',
+        'c4e3f5c5c3g6e2f2c6b5e6d7c7b3a4c8e8f4g3g5h5g4h3e7f6f7f3h4',
+        'd3e3f5e6f2c4e7g5b4c2d2d1f4e8f7d6c6d7c7b5c5c8b6a6b3f3g4g3',
+    ),
+    'endgame': (
+        'e6d6c3f4d7c5g3d8b5b4b6d2a3f6e7g4e3d3h4g5c4e8e1a5f8a4g6c7e2h6a6b3c6c1c2f7c8f1f5g2f2h2h5d1h3h7f3b1',
+        'c4c5b6d3c2a7e6f6g6d2d1e3f4g3g4f2c3c1b3e7d6g5h4a3d8e8f5h6f7f8h5d7e1h3b4f3c7a4a5f1e2c6b5a6g2h1g1h2',
+        'd3c3b3e3f3c5d6f2f6a3d2e7c7c1d1e1f8d7b4f4g3g4g5h4d8b6b5a5e2e6f7h6f5e8f1g6h3c6c2h5c4a6c8b2a4h2a1g1',
+        'c4c5f6c3b5g7d3a5h8e2b6f4c2b3f5f3f2g4a3c1a6c6e3e6f7d7h4f8d1f1c8c7d6e7e8d2d8g5g3h5e1h3g6h6a4b4g2b7',
+        'c4e3f2c5d6e2f4f5c6b5f6g5f3g3a5e6d7e7f7f8g4c7c8b6a6b3d3c3c2h4h3d2d1e1h6b4f1g6a4c1e8d8h5a3g2a7b7g1',
+        'f5f6e6f4g6d7f3g4d3c4c6e3c3c5e2e1d1f1c2h6h4f2c8c1g3h3b4a4b3g5b5h5d2a3g2d6f7f8b2h1g7d8e8a6e7b8b6a5',
+    ),
+}
+DEFAULT_THRESHOLD = 0.1
+# each timing is the best of this many runs
+DEFAULT_REPEAT = 3
+# the least time spent on one evals/sec measurement; a fixed number of rounds
+# finishes too quickly on a fast board to be timed reliably
+EVAL_SECONDS = 0.5
+
+
+def perft(env, depth):
+    # leaves of the move tree depth plies deep
+    if depth == 0:
+        return 1
+    moves = env.get_moves()
+    if not moves:
+        if not env.has_moves(-env.turn):
+            return 1
+        moves = [None]
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        undo = env.make_move(move)
+        nodes += perft(env, depth - 1)
+        env.unmake_move(undo)
+    return nodes
+
+def check_perft(cls, max_depth):
+    # raises AssertionError if a count is wrong
+    for depth in range(max_depth + 1):
+        nodes = perft(cls(), depth)
+        assert nodes == PERFT_COUNTS[depth], f'{cls.__name__} perft({depth}) is {nodes:,d}, not {PERFT_COUNTS[depth]:,d}'
+
+def load_positions(names=POSITION_SETS, cls=Othello):
+    return {name: [replay(read_transcript(text), cls) for text in POSITION_SETS[name]] for name in names}
+
+def best_time(func, repeat):
+    # the fastest of repeat runs, which is the one least disturbed by
+    # anything else the machine was doing; returns (seconds, result)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best[0]:
+            best = elapsed, result
+    return best
+
+def metric(value, unit, higher_is_better):
+    return {'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+
+def bench_perft(depth, repeat):
+    results = {}
+    for cls in (Othello, BitboardOthello):
+        seconds, nodes = best_time(lambda: perft(cls(), depth), repeat)
+        assert nodes == PERFT_COUNTS[depth]
+        name = f'perft.{cls.__name__}.depth{depth}'
+        results[f'{name}.seconds'] = metric(seconds, 'seconds', False)
+        results[f'{name}.nodes_per_sec'] = metric(nodes / seconds, 'nodes/sec', True)
+    return results
+
+def evals_per_sec(envs, min_seconds):
+    # minimax.heuristic for the player to move, over the set again and again
+    # until at least min_seconds have passed
+    evals = 0
+    start = time.perf_counter()
+    while True:
+        for env in envs:
+            minimax.heuristic(env.turn, env)
+        evals += len(envs)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return evals / elapsed
+
+def bench_eval(positions, repeat, min_seconds=EVAL_SECONDS):
+    # the best rate of repeat runs over each set
+    results = {}
+    for name, envs in positions.items():
+        rate = max(evals_per_sec(envs, min_seconds) for _ in range(repeat))
+        results[f'eval.{name}.evals_per_sec'] = metric(rate, 'evals/sec', True)
+    return results
+
+def search_position(env, depth):
+    # iterative deepening to depth from a fresh table, without the eval
+    # cache; returns the stats
+    stats = SearchStats()
+    minimax.iterative_deepening(env, float('inf'), depth, tt=TranspositionTable(16), ordering=MoveOrdering(), stats=stats)
+    return stats
+
+def bench_search(positions, depth, repeat):
+    # nodes/sec and the seconds to finish each depth, summed over a set;
+    # endgames are solved exactly instead
+    results = {}
+    cache, minimax.EVAL_CACHE = minimax.EVAL_CACHE, None
+    try:
+        for name, envs in positions.items():
+            if name == 'endgame':
+                seconds, solves = best_time(lambda: [solve_endgame(env) for env in envs], repeat)
+                nodes = sum(n for _, _, n in solves)
+                results['solve.endgame.seconds'] = metric(seconds, 'seconds', False)
+                results['solve.endgame.nodes'] = metric(nodes, 'nodes', False)
+                results['solve.endgame.nodes_per_sec'] = metric(nodes / seconds, 'nodes/sec', True)
+                continue
+            seconds, runs = best_time(lambda: [search_position(env, depth) for env in envs], repeat)
+            nodes = sum(stats.nodes for stats in runs)
+            results[f'search.{name}.nodes'] = metric(nodes, 'nodes', False)
+            results[f'search.{name}.nodes_per_sec'] = metric(nodes / seconds, 'nodes/sec', True)
+            # a search that finds a won or lost game stops early; its
+            # missing depths count as taking no time
+            for d in range(1, depth + 1):
+                to_depth = sum(it['seconds'] for stats in runs for it in stats.iterations if it['depth'] <= d)
+                results[f'search.{name}.time_to_depth{d}'] = metric(to_depth, 'seconds', False)
+    finally:
+        minimax.EVAL_CACHE = cache
+    return results
+
+def run_suite(sets=tuple(POSITION_SETS), perft_depth=6, search_depth=4, repeat=DEFAULT_REPEAT):
+    check_perft(Othello, perft_depth)
+    check_perft(BitboardOthello, perft_depth)
+    positions = load_positions(sets)
+    metrics = {}
+    metrics.update(bench_perft(perft_depth, repeat))
+    metrics.update(bench_eval(positions, repeat))
+    metrics.update(bench_search(positions, search_depth, repeat))
+    return {
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'processor': platform.processor()},
+        'settings': {'sets': list(sets), 'perft_depth': perft_depth, 'search_depth': search_depth, 'repeat': repeat,
+                     'eval_seconds': EVAL_SECONDS},
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'metrics': metrics,
+    }
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    # (name, baseline value, new value, relative change, regressed) for every
+    # metric in both; a positive change is an improvement
+    rows = []
+    for name, new in results['metrics'].items():
+        old = baseline['metrics'].get(name)
+        if old is None or not old['value']:
+            continue
+        if new['higher_is_better']:
+            change = (new['value'] - old['value']) / old['value']
+        else:
+            change = (old['value'] - new['value']) / old['value']
+        rows.append((name, old['value'], new['value'], change, change < -threshold))
+    return rows
+
+def format_results(results):
+    return '\n'.join(f'{name}: {m["value"]:,.6g} {m["unit"]}' for name, m in results['metrics'].items())
+
+def format_comparison(rows, threshold):
+    lines = [f'{name}: {old:,.6g} -> {new:,.6g} ({change:+.1%}){"  REGRESSION" if regressed else ""}'
+             for name, old, new, change, regressed in rows]
+    regressions = sum(regressed for *_, regressed in rows)
+    lines.append(f'{regressions} of {len(rows)} metrics worse by more than {threshold:.0%}')
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description='run the benchmark suite and compare it with a baseline')
+    parser.add_argument('--out', default='suite.json', help='where to write the results')
+    parser.add_argument('--baseline', default=None, help='results of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='relative change that counts as a regression, 0.1 for 10%%')
+    parser.add_argument('--sets', default=','.join(POSITION_SETS), help='position sets to run, comma separated')
+    parser.add_argument('--perft-depth', type=int, default=6)
+    parser.add_argument('--depth', type=int, default=4, help='search depth for the opening and midgame sets')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='time each measurement this many times and keep the fastest')
+    args = parser.parse_args()
+    sets = tuple(args.sets.split(','))
+    for name in sets:
+        if name not in POSITION_SETS:
+            parser.error(f'unknown position set: {name}')
+    if not 0 <= args.perft_depth < len(PERFT_COUNTS):
+        parser.error(f'perft depth should be from 0 to {len(PERFT_COUNTS) - 1}')
+    if args.repeat < 1:
+        parser.error('repeat should be at least 1')
+
+    results = run_suite(sets, args.perft_depth, args.depth, args.repeat)
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(format_results(results))
+    print(f'results in {args.out}')
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, args.threshold)
+        print(format_comparison(rows, args.threshold))
+        if any(regressed for *_, regressed in rows):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
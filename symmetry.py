@@ -0,0 +1,115 @@
+import numpy as np
+
+# the 8 symmetries of the board on bitboards (square (x, y) is bit 8*y + x).
+# transform t transposes when t & 4, then mirrors x when t & 1 and y when t & 2;
+# transform 0 is the identity
+
+def flip_x(bits):
+    # (x, y) -> (7 - x, y): reverse the bits in each byte
+    bits = ((bits >> 1) & 0x5555555555555555) | ((bits & 0x5555555555555555) << 1)
+    bits = ((bits >> 2) & 0x3333333333333333) | ((bits & 0x3333333333333333) << 2)
+    return ((bits >> 4) & 0x0F0F0F0F0F0F0F0F) | ((bits & 0x0F0F0F0F0F0F0F0F) << 4)
+
+def flip_y(bits):
+    # (x, y) -> (x, 7 - y): reverse the byte order
+    return int.from_bytes(bits.to_bytes(8, 'little'), 'big')
+
+def transpose(bits):
+    # (x, y) -> (y, x)
+    t = 0x0F0F0F0F00000000 & (bits ^ (bits << 28))
+    bits ^= t ^ (t >> 28)
+    t = 0x3333000033330000 & (bits ^ (bits << 14))
+    bits ^= t ^ (t >> 14)
+    t = 0x5500550055005500 & (bits ^ (bits << 7))
+    return bits ^ t ^ (t >> 7)
+
+def transform_bits(bits, t):
+    if t & 4:
+        bits = transpose(bits)
+    if t & 1:
+        bits = flip_x(bits)
+    if t & 2:
+        bits = flip_y(bits)
+    return bits
+
+def transform_square(sq, t):
+    x, y = sq & 7, sq >> 3
+    if t & 4:
+        x, y = y, x
+    if t & 1:
+        x = 7 - x
+    if t & 2:
+        y = 7 - y
+    return 8*y + x
+
+# INVERSE[t] undoes transform t
+INVERSE = [next(u for u in range(8) if all(transform_square(transform_square(sq, t), u) == sq for sq in range(64)))
+           for t in range(8)]
+
+def canonical_bits(p, o):
+    # the smallest (p, o) over the 8 transforms and the transform that gives it
+    best = (p, o, 0)
+    for t in range(1, 8):
+        p2 = transform_bits(p, t)
+        if p2 > best[0]:
+            continue
+        o2 = transform_bits(o, t)
+        if (p2, o2) < best[:2]:
+            best = (p2, o2, t)
+    return best
+
+def transform_move(move, t):
+    # the move on the board after transform t; None (a pass) stays None
+    if not move:
+        return move
+    sq = transform_square(8*move[1] + move[0], t)
+    return (sq & 7, sq >> 3)
+
+def untransform_move(move, t):
+    # maps a move on the transformed board back to the original board
+    return transform_move(move, INVERSE[t])
+
+
+# the same transforms over numpy arrays of uint64 bitboards
+U64 = np.uint64
+
+def flip_x_batch(bits):
+    for shift, mask in ((1, 0x5555555555555555), (2, 0x3333333333333333), (4, 0x0F0F0F0F0F0F0F0F)):
+        shift, mask = U64(shift), U64(mask)
+        bits = ((bits >> shift) & mask) | ((bits & mask) << shift)
+    return bits
+
+def flip_y_batch(bits):
+    return bits.byteswap()
+
+def transpose_batch(bits):
+    for shift, mask in ((28, 0x0F0F0F0F00000000), (14, 0x3333000033330000), (7, 0x5500550055005500)):
+        shift, mask = U64(shift), U64(mask)
+        t = mask & (bits ^ (bits << shift))
+        bits = bits ^ t ^ (t >> shift)
+    return bits
+
+def transform_bits_batch(bits, t):
+    bits = np.asarray(bits, dtype=U64)
+    if t & 4:
+        bits = transpose_batch(bits)
+    if t & 1:
+        bits = flip_x_batch(bits)
+    if t & 2:
+        bits = flip_y_batch(bits)
+    return bits
+
+def canonical_bits_batch(p, o):
+    # canonical_bits for arrays of positions: returns the canonical p and o and the transforms
+    p = np.asarray(p, dtype=U64)
+    o = np.asarray(o, dtype=U64)
+    best_p, best_o = p, o
+    best_t = np.zeros(p.shape, dtype=np.int8)
+    for t in range(1, 8):
+        p2 = transform_bits_batch(p, t)
+        o2 = transform_bits_batch(o, t)
+        better = (p2 < best_p) | ((p2 == best_p) & (o2 < best_o))
+        best_p = np.where(better, p2, best_p)
+        best_o = np.where(better, o2, best_o)
+        best_t = np.where(better, np.int8(t), best_t)
+    return best_p, best_o, best_t
@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+# the modules live at the top of the repo rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from records import random_games
+
+
+@pytest.fixture(scope='session')
+def games():
+    return random_games(20)
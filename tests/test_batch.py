@@ -0,0 +1,54 @@
+from othello import Othello
+from bitboard import BitboardOthello, get_env_bits
+from batch import heuristic_batch, leaf_values, U64
+from evalcache import EvalCache
+import copy
+import minimax
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope='module')
+def positions(games):
+    # every position from the first 10 games
+    envs = []
+    for game in games[:10]:
+        env = Othello()
+        for move in game:
+            envs.append(copy.deepcopy(env))
+            env.make_move(move)
+    return envs
+
+def test_heuristic_matches_single(positions):
+    boards = np.array([env.board for env in positions])
+    players = np.array([env.turn for env in positions])
+    expected = [minimax.heuristic(env.turn, env) for env in positions]
+    assert heuristic_batch(players, boards).tolist() == expected
+    black, white = zip(*(get_env_bits(env, env.black) for env in positions))
+    assert heuristic_batch(players, np.array(black, dtype=U64), np.array(white, dtype=U64)).tolist() == expected
+
+@pytest.mark.parametrize('cls', [Othello, BitboardOthello])
+def test_leaf_values_match_single_leaves(cls, positions, monkeypatch):
+    # each child scored for its own player to move and negated, as the
+    # search's single leaves are, with or without the cache
+    monkeypatch.setattr(minimax, 'EVAL_CACHE', None)
+    cache = EvalCache()
+    for env in positions[::3]:
+        env = env if cls is Othello else BitboardOthello.from_othello(env)
+        moves = env.get_moves()
+        if not moves:
+            continue
+        expected = []
+        for move in moves:
+            undo = env.make_move(move)
+            expected.append(minimax.final_value(-env.turn, env) if env.get_num_empty() == 0 else -minimax.evaluate(env.turn, env))
+            env.unmake_move(undo)
+        assert leaf_values(env.turn, env, moves) == expected
+        assert leaf_values(env.turn, env, moves, cache=cache) == expected
+        assert leaf_values(env.turn, env, moves, cache=cache) == expected
+
+def test_batch_and_single_searches_agree(positions, monkeypatch):
+    monkeypatch.setattr(minimax, 'EVAL_CACHE', None)
+    for env in positions[20:200:15]:
+        if env.get_moves():
+            assert minimax.Search(batch=True).run(env, 3) == minimax.Search(batch=False).run(env, 3)
@@ -0,0 +1,56 @@
+from othello import Othello
+from bitboard import BitboardOthello, board_to_bits, get_env_bits
+import numpy as np
+import pytest
+
+
+def test_same_moves_boards_and_winner(games):
+    for game in games:
+        env = Othello()
+        env2 = BitboardOthello()
+        for move in game:
+            assert env.get_moves() == env2.get_moves()
+            env.make_move(move)
+            env2.make_move(move)
+            assert (env.board == env2.board).all()
+            assert env.terminal() == env2.terminal()
+            assert env.get_hash() == env2.get_hash()
+            assert env.bits == [board_to_bits(env.board, p) for p in (0, 1, -1)]
+        assert env.get_winner() == env2.get_winner()
+
+def test_counts_match(games):
+    for game in games[:5]:
+        env = Othello()
+        env2 = BitboardOthello()
+        for move in game:
+            assert (env.get_num_black(), env.get_num_white(), env.get_num_empty()) == \
+                (env2.get_num_black(), env2.get_num_white(), env2.get_num_empty())
+            for player in (env.black, env.white):
+                assert env.has_moves(player) == env2.has_moves(player)
+                assert env.count_moves(player) == env2.count_moves(player)
+                assert env.count_potential_moves(player) == env2.count_potential_moves(player)
+            env.make_move(move)
+            env2.make_move(move)
+
+def test_conversions_round_trip(games):
+    env = Othello()
+    for move in games[0][:30]:
+        env.make_move(move)
+    bits = BitboardOthello.from_othello(env)
+    assert get_env_bits(bits) == get_env_bits(env)
+    back = bits.to_othello()
+    assert (back.board == env.board).all()
+    assert (back.turn, back.blackpass, back.whitepass) == (env.turn, env.blackpass, env.whitepass)
+
+def test_board_follows_the_bits():
+    env = BitboardOthello()
+    board = env.board
+    assert env.board is board
+    with pytest.raises(ValueError):
+        board[0, 0] = 1
+    # set directly, as Position.to_env does, not through make_move
+    env.black_bits |= 1
+    assert env.board[0, 0] == env.black
+    assert board_to_bits(env.board, env.black) == env.black_bits
+    env.unmake_move(env.make_move(env.get_moves()[0]))
+    assert np.count_nonzero(env.board) == 5
@@ -0,0 +1,21 @@
+from othello import Othello
+from bitboard import BitboardOthello
+from records import random_games
+import numpy as np
+
+
+def test_counts_follow_make_and_unmake():
+    # random games pass often, so terminal is reached both ways
+    for moves in random_games(100):
+        env = Othello()
+        undos = []
+        for move in moves:
+            env.get_moves()
+            undos.append(env.make_move(move))
+            assert env.counts == [np.count_nonzero(env.board == p) for p in (0, 1, -1)]
+            bits = BitboardOthello.from_othello(env)
+            assert env.terminal() == bits.terminal() == (not bits.has_moves(1) and not bits.has_moves(-1))
+        assert env.terminal() and env.get_winner() == np.sign(env.get_num_black() - env.get_num_white())
+        for undo in reversed(undos):
+            env.unmake_move(undo)
+        assert env.counts == [60, 2, 2]
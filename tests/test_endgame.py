@@ -0,0 +1,34 @@
+from othello import Othello
+from endgame import solve_endgame, SolveStopped
+import minimax
+import pytest
+import threading
+import time
+
+
+def endgame_position(game, empties=12):
+    # the position in game with the given number of empty squares
+    env = Othello()
+    for move in game:
+        if env.get_num_empty() <= empties and env.get_moves():
+            return env
+        env.make_move(move)
+    return None
+
+def test_solve_stops_at_its_deadline(games):
+    env = endgame_position(games[0])
+    with pytest.raises(SolveStopped):
+        solve_endgame(env, deadline=time.time())
+
+def test_timed_move_falls_back_to_the_search(games, monkeypatch):
+    # a solve that can't finish hands over to iterative deepening
+    monkeypatch.setattr(minimax, 'ENDGAME_TIME_SHARE', 0)
+    env = endgame_position(games[0])
+    move, stats = minimax.find_move(env, time_limit=0.1)
+    assert stats.source != 'endgame' and move in env.get_moves()
+
+def test_stopped_timed_solve_still_raises(games):
+    stop = threading.Event()
+    stop.set()
+    with pytest.raises(SolveStopped):
+        minimax.find_move(endgame_position(games[0]), time_limit=10, stop=stop)
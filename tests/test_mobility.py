@@ -0,0 +1,58 @@
+from othello import Othello, NEIGHBORS
+from bitboard import BitboardOthello, iter_squares
+from batch import heuristic_batch
+import copy
+import minimax
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope='module')
+def positions(games):
+    envs = []
+    for game in games:
+        env = Othello()
+        for move in game:
+            envs.append(copy.deepcopy(env))
+            env.make_move(move)
+    return envs
+
+def list_mobility(max_player, env):
+    # mobility from a move list for each side, as it was before the counts
+    turn, blackpass, whitepass = env.turn, env.blackpass, env.whitepass
+    env.turn = max_player
+    max_moves = env.get_moves() or []
+    env.turn = -max_player
+    min_moves = env.get_moves() or []
+    env.turn, env.blackpass, env.whitepass = turn, blackpass, whitepass
+    if not max_moves and not min_moves:
+        return 0
+    return 100 * (len(max_moves) - len(min_moves)) / (len(max_moves) + len(min_moves))
+
+def test_counts_match_lists_and_scans(positions):
+    for env in positions:
+        bits = BitboardOthello.from_othello(env)
+        state = (env.turn, env.blackpass, env.whitepass)
+        for player in (1, -1):
+            saved, env.turn = env.turn, player
+            count = len(env.get_moves() or [])
+            env.turn = saved
+            env.blackpass, env.whitepass = state[1:]
+            assert env.count_moves(player) == bits.count_moves(player) == count
+            near = sum(1 for sq in range(64) if env.board[sq & 7, sq >> 3] == 0 and
+                       any(env.board[sq2 & 7, sq2 >> 3] == -player for sq2 in iter_squares(NEIGHBORS[sq])))
+            assert env.count_potential_moves(player) == bits.count_potential_moves(player) == near
+
+def test_mobility_leaves_flags_alone(positions):
+    for env in positions:
+        state = (env.turn, env.blackpass, env.whitepass)
+        assert minimax.mobility(env.turn, env) == list_mobility(env.turn, env)
+        minimax.potential_mobility(env.turn, env)
+        assert (env.turn, env.blackpass, env.whitepass) == state
+
+def test_batch_weighs_potential_mobility(positions, monkeypatch):
+    monkeypatch.setattr(minimax, 'WEIGHTS', minimax.WEIGHTS[:5] + (40,))
+    boards = np.array([env.board for env in positions])
+    players = np.array([env.turn for env in positions])
+    scores = heuristic_batch(players, boards, weights=minimax.WEIGHTS)
+    assert np.allclose(scores, [minimax.heuristic(env.turn, env) for env in positions])
@@ -0,0 +1,37 @@
+from othello import Othello
+from bitboard import BitboardOthello
+from position import Position, same_position
+from records import random_games
+import pickle
+import pytest
+
+
+@pytest.fixture(scope='module')
+def positions():
+    # random games pass often, so the pass flags get exercised
+    positions = []
+    for moves in random_games(100):
+        position = Position()
+        for move in moves:
+            positions.append(position)
+            position = position.play(move)
+    return positions
+
+def test_follows_the_board(games):
+    for moves in games:
+        env = BitboardOthello()
+        position = Position()
+        for move in moves:
+            env.get_moves()
+            assert Position.from_env(env) == position and position.get_hash() == env.get_hash()
+            assert position.get_moves() == (env.get_moves() or None)
+            for cls in (Othello, BitboardOthello):
+                assert same_position(position.to_env(cls), env)
+            env.make_move(move)
+            position = position.play(move)
+
+def test_bytes_round_trip(positions):
+    assert all(Position.from_bytes(p.to_bytes()) == p for p in positions)
+
+def test_pickle_round_trip(positions):
+    assert pickle.loads(pickle.dumps(positions)) == positions
@@ -0,0 +1,32 @@
+from othello import Othello, NEIGHBORS
+
+
+def scanned_moves(env):
+    # the bounds-checked walk over all 64 squares the ray tables replaced
+    moves = [(x, y) for y in range(8) for x in range(8) if env.is_valid(x, y)]
+    return moves or None
+
+def check_frontier(env):
+    # the incremental masks must match the board
+    occupied = sum(1 << (8*y + x) for x in range(8) for y in range(8) if env.board[x, y] != 0)
+    frontier = sum(1 << sq for sq in range(64) if not occupied >> sq & 1 and NEIGHBORS[sq] & occupied)
+    assert env.occupied == occupied and env.frontier == frontier
+
+def test_moves_match_scan(games):
+    for game in games:
+        env = Othello()
+        for move in game:
+            assert env.get_moves() == scanned_moves(env)
+            env.make_move(move)
+
+def test_frontier_follows_make_and_unmake(games):
+    for game in games[:10]:
+        env = Othello()
+        for move in game:
+            for move2 in env.get_moves() or [None]:
+                undo = env.make_move(move2)
+                check_frontier(env)
+                env.unmake_move(undo)
+                check_frontier(env)
+            env.make_move(move)
+        check_frontier(env)
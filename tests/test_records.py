@@ -0,0 +1,40 @@
+from othello import Othello
+from bitboard import BitboardOthello
+from records import (write_transcript, read_transcript, replay, write_database, PositionDatabase, env_from_position,
+                     training_arrays, random_games)
+from patterns import training_positions
+from position import same_position
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope='module')
+def many_games():
+    # random games pass often, and some end early with both sides passing
+    return random_games(100)
+
+def test_transcripts_round_trip(many_games):
+    assert any(None in moves for moves in many_games)
+    assert [read_transcript(write_transcript(moves)) for moves in many_games] == many_games
+
+def test_bad_transcripts_raise():
+    for text in ('f5d', 'f5f5', 'z9', 'f5pa'):
+        with pytest.raises(ValueError):
+            read_transcript(text)
+
+def test_database_round_trip(many_games, tmp_path):
+    path = str(tmp_path / 'positions.db')
+    count = write_database(path, many_games)
+    with PositionDatabase(path) as db:
+        assert len(db) == count == sum(len(moves) + 1 for moves in many_games)
+        assert list(db.games()) == many_games
+        assert sum(len(batch) for batch in db.batches(1000)) == count
+        # every stored position rebuilds the board it came from, pass flags included
+        for index in range(0, count, 23):
+            position = db[index]
+            moves = many_games[int(position['game'])][:int(position['ply'])]
+            for cls in (Othello, BitboardOthello):
+                assert same_position(env_from_position(position, cls), replay(moves, cls))
+        p, o, targets = training_arrays(np.array(db.positions))
+    p2, o2, targets2 = training_positions(many_games)
+    assert np.array_equal(p, p2) and np.array_equal(o, o2) and np.array_equal(targets, targets2)
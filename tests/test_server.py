@@ -0,0 +1,19 @@
+from server import parse_request
+import pytest
+
+
+def test_position_request():
+    black, white = 0x0000000810000000, 0x0000001008000000
+    assert parse_request({'black': black, 'white': white, 'depth': 3}) == (black, white, 1, 0, 3, None)
+
+@pytest.mark.parametrize('request_', [
+    {'black': 1.5, 'white': 2},
+    {'black': '1', 'white': 2},
+    {'black': True, 'white': 2},
+    {'black': 1, 'white': 2, 'turn': -1.0},
+    {'black': 1, 'white': 1},
+    {'black': 2**64, 'white': 2},
+])
+def test_bad_positions_are_refused(request_):
+    with pytest.raises(ValueError, match='not a position'):
+        parse_request(request_)
@@ -0,0 +1,40 @@
+from othello import Othello
+from bitboard import BitboardOthello, get_env_bits, get_stability_bb
+from batch import get_stability_batch, U64
+from position import transform_env
+import copy
+import minimax
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope='module')
+def positions(games):
+    # every position from the first 10 games
+    envs = []
+    for game in games[:10]:
+        env = Othello()
+        for move in game:
+            envs.append(copy.deepcopy(env))
+            env.make_move(move)
+    return envs
+
+def test_matches_the_per_disc_reference(positions):
+    for env in positions:
+        for player in (env.black, env.white):
+            assert minimax.stability(player, env, 0, 0) == minimax.stability_recursive(player, env, 0, 0, propagate=False)
+
+def test_same_on_both_boards(positions):
+    for env in positions[::7]:
+        assert minimax.stability(env.turn, env, 0, 0) == minimax.stability(env.turn, BitboardOthello.from_othello(env), 0, 0)
+
+def test_same_for_all_symmetries(positions):
+    # which the propagating counts the evaluator used to have aren't
+    for env in positions[::5]:
+        counts = minimax.stability(env.turn, env, 0, 0)
+        assert all(minimax.stability(env.turn, transform_env(env, t), 0, 0) == counts for t in range(8))
+
+def test_batch_matches_single(positions):
+    p, o = zip(*(get_env_bits(env) for env in positions))
+    batch = get_stability_batch(np.array(p, dtype=U64), np.array(o, dtype=U64))
+    assert [tuple(counts) for counts in np.array(batch).T.tolist()] == [get_stability_bb(*bits) for bits in zip(p, o)]
@@ -0,0 +1,60 @@
+from othello import Othello
+from bitboard import BitboardOthello, get_env_bits
+from position import transform_env
+from symmetry import (transform_bits, transform_square, transform_move, untransform_move, INVERSE,
+                      transform_bits_batch, canonical_bits, canonical_bits_batch)
+import copy
+import numpy as np
+import pytest
+
+
+def positions(games, cls=Othello):
+    # every position from the first few games
+    envs = []
+    for game in games[:5]:
+        env = cls()
+        for move in game:
+            envs.append(copy.deepcopy(env))
+            env.make_move(move)
+    return envs
+
+@pytest.mark.parametrize('t', range(8))
+def test_squares_and_bits_agree(t):
+    for sq in range(64):
+        assert transform_bits(1 << sq, t) == 1 << transform_square(sq, t)
+        assert transform_square(transform_square(sq, t), INVERSE[t]) == sq
+
+def test_transforms_are_distinct():
+    assert len({transform_bits(0x0102040810204080 ^ 0xFF, t) for t in range(8)}) == 8
+
+@pytest.mark.parametrize('cls', [Othello, BitboardOthello])
+def test_positions_transform(cls, games):
+    for env in positions(games, cls):
+        moves = env.get_moves()
+        key = env.get_canonical_hash()[0]
+        for t in range(8):
+            env2 = transform_env(env, t)
+            # same moves, carried through the transform, and back again
+            moves2 = env2.get_moves()
+            assert sorted(moves2 or []) == sorted(transform_move(m, t) for m in moves or [])
+            assert sorted(untransform_move(m, t) for m in moves2 or []) == sorted(moves or [])
+            # one key for all 8, and the transform it reports really gives the canonical board
+            key2, t2 = env2.get_canonical_hash()
+            assert key2 == key
+            black, white = get_env_bits(env2, env2.black)
+            assert env2.get_canonical()[:2] == (transform_bits(black, t2), transform_bits(white, t2))
+            # making the transformed move gives the transformed position
+            if moves:
+                after = copy.deepcopy(env)
+                after.make_move(moves[0])
+                env2.make_move(transform_move(moves[0], t))
+                assert (env2.board == transform_env(after, t).board).all()
+
+def test_batch_matches_single(games):
+    envs = positions(games)
+    black = np.array([get_env_bits(env, env.black)[0] for env in envs], dtype=np.uint64)
+    white = np.array([get_env_bits(env, env.black)[1] for env in envs], dtype=np.uint64)
+    for t in range(8):
+        assert transform_bits_batch(black, t).tolist() == [transform_bits(int(b), t) for b in black]
+    p, o, ts = canonical_bits_batch(black, white)
+    assert list(zip(p.tolist(), o.tolist(), ts.tolist())) == [canonical_bits(int(b), int(w)) for b, w in zip(black, white)]
@@ -0,0 +1,32 @@
+from othello import Othello
+from bitboard import BitboardOthello
+import pytest
+
+
+def state(env):
+    # everything a move can change, on either board type
+    extra = (list(env.counts), list(env.bits), env.occupied, env.frontier) if isinstance(env, Othello) else (env.black_bits, env.white_bits)
+    return (env.board.tolist(), env.turn, env.blackpass, env.whitepass, env.get_hash()) + extra
+
+@pytest.mark.parametrize('cls', [Othello, BitboardOthello])
+def test_every_move_undoes(cls, games):
+    # every move, including passes, must undo back to the exact same state
+    for game in games:
+        env = cls()
+        for move in game:
+            moves = env.get_moves()
+            before = state(env)
+            for move2 in moves or [None]:
+                env.unmake_move(env.make_move(move2))
+                assert state(env) == before
+            env.make_move(move)
+
+@pytest.mark.parametrize('cls', [Othello, BitboardOthello])
+def test_whole_game_undoes(cls, games):
+    for game in games[:5]:
+        env = cls()
+        start = state(env)
+        undos = [env.make_move(move) for move in game]
+        for undo in reversed(undos):
+            env.unmake_move(undo)
+        assert state(env) == start
@@ -0,0 +1,204 @@
+from bitboard import BitboardOthello
+from endgame import ENDGAME_EMPTIES
+from patterns import PatternEvaluator
+from concurrent.futures import ProcessPoolExecutor
+import minimax
+import argparse
+import itertools
+import json
+import math
+import random
+import time
+
+# a player is a spec string: "random", or "minimax" with options, e.g.
+# "minimax:depth=3" or "minimax:depth=2,weights=10/70/800/50/300,endgame=10".
+# weights are in the order of batch.WEIGHTS; a sixth, for potential mobility,
+# is 0 when left out. "patterns=weights.npy" scores leaves with trained
+# pattern weights instead of the weighted heuristic
+
+
+def parse_player(spec):
+    kind, _, options = spec.partition(':')
+    config = {'name': spec, 'type': kind, 'depth': 2, 'weights': minimax.WEIGHTS, 'endgame': ENDGAME_EMPTIES, 'patterns': None}
+    if kind not in ('random', 'minimax'):
+        raise ValueError(f'unknown player type: {kind}')
+    for option in filter(None, options.split(',')):
+        key, _, value = option.partition('=')
+        if key == 'depth':
+            config['depth'] = int(value)
+        elif key == 'weights':
+            config['weights'] = tuple(float(w) for w in value.split('/'))
+            if len(config['weights']) == 5:
+                config['weights'] += (0,)
+            if len(config['weights']) != 6:
+                raise ValueError('weights takes five or six values')
+        elif key == 'endgame':
+            config['endgame'] = int(value)
+        elif key == 'patterns':
+            config['patterns'] = value
+        else:
+            raise ValueError(f'unknown player option: {key}')
+    return config
+
+def make_openings(num_openings, plies, seed=0):
+    # distinct random openings of the given length
+    rng = random.Random(seed)
+    openings = set()
+    attempts = 0
+    while len(openings) < num_openings and attempts < num_openings * 100:
+        attempts += 1
+        env = BitboardOthello()
+        opening = []
+        for _ in range(plies):
+            moves = env.get_moves()
+            if not moves:
+                break
+            move = rng.choice(moves)
+            env.make_move(move)
+            opening.append(move)
+        openings.add(tuple(opening))
+    return sorted(openings)
+
+_evaluators = {} # pattern evaluators loaded by this worker, by path
+
+def load_evaluator(path):
+    if path is None:
+        return None
+    if path not in _evaluators:
+        _evaluators[path] = PatternEvaluator.load(path)
+    return _evaluators[path]
+
+def choose_move(config, env, rng):
+    moves = env.get_moves()
+    if not moves:
+        return None
+    if config['type'] == 'random':
+        return rng.choice(moves)
+    minimax.WEIGHTS = config['weights']
+    minimax.EVALUATOR = load_evaluator(config['patterns'])
+    return minimax.get_computer_move(env, config['depth'], endgame_empties=config['endgame'])
+
+def play_game(game):
+    # runs in a worker; returns one result record
+    index, black, white, opening_index, opening = game
+    rng = random.Random(index)
+    env = BitboardOthello()
+    for move in opening:
+        env.get_moves()
+        env.make_move(move)
+    times = {env.black: [], env.white: []}
+    while not env.terminal():
+        config = black if env.turn == env.black else white
+        start = time.time()
+        move = choose_move(config, env, rng)
+        times[env.turn].append(time.time() - start)
+        env.make_move(move)
+    score = env.get_num_black() - env.get_num_white()
+    return {
+        'game': index,
+        'black': black['name'],
+        'white': white['name'],
+        'opening': opening_index,
+        'score': score,
+        # [moves, total seconds, longest move]
+        'black_time': [len(times[env.black]), round(sum(times[env.black]), 4), round(max(times[env.black], default=0), 4)],
+        'white_time': [len(times[env.white]), round(sum(times[env.white]), 4), round(max(times[env.white], default=0), 4)],
+    }
+
+def schedule(players, openings):
+    # every pair plays every opening twice, once with each colour
+    games = []
+    for a, b in itertools.combinations(players, 2):
+        for i, opening in enumerate(openings):
+            games.append((a, b, i, opening))
+            games.append((b, a, i, opening))
+    return [(index,) + game for index, game in enumerate(games)]
+
+def run_tournament(players, openings, path, workers=None):
+    games = schedule(players, openings)
+    results = []
+    with open(path, 'w') as f, ProcessPoolExecutor(workers) as executor:
+        for result in executor.map(play_game, games, chunksize=4):
+            f.write(json.dumps(result, separators=(',', ':')) + '\n')
+            f.flush()
+            results.append(result)
+    return results
+
+def read_results(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def estimate_elo(names, results, iterations=200):
+    # maximum likelihood ratings (draws count half), mean rating 0
+    ratings = {name: 0.0 for name in names}
+    scores = {name: 0.0 for name in names}
+    games = []
+    for r in results:
+        s = 1.0 if r['score'] > 0 else 0.0 if r['score'] < 0 else 0.5
+        scores[r['black']] += s
+        scores[r['white']] += 1 - s
+        games.append((r['black'], r['white']))
+    counts = {name: sum(1 for a, b in games if name in (a, b)) for name in names}
+    for _ in range(iterations):
+        expected = {name: 0.0 for name in names}
+        variance = {name: 0.0 for name in names}
+        for a, b in games:
+            e = 1 / (1 + 10 ** ((ratings[b] - ratings[a]) / 400))
+            expected[a] += e
+            expected[b] += 1 - e
+            variance[a] += e * (1 - e)
+            variance[b] += e * (1 - e)
+        for name in names:
+            if counts[name] and variance[name]:
+                # damped newton step; clamp so perfect scores stay finite
+                s = min(max(scores[name], 0.5), counts[name] - 0.5)
+                step = 400 / math.log(10) * (s - expected[name]) / variance[name]
+                ratings[name] += max(-100, min(100, step))
+        mean = sum(ratings.values()) / len(ratings)
+        ratings = {name: r - mean for name, r in ratings.items()}
+    return ratings
+
+def summarize(results):
+    names = sorted({r['black'] for r in results} | {r['white'] for r in results})
+    stats = {name: {'wins': 0, 'draws': 0, 'losses': 0, 'moves': 0, 'time': 0.0, 'max': 0.0} for name in names}
+    for r in results:
+        for name, sign, key in ((r['black'], 1, 'black_time'), (r['white'], -1, 'white_time')):
+            s = stats[name]
+            if r['score'] * sign > 0:
+                s['wins'] += 1
+            elif r['score'] == 0:
+                s['draws'] += 1
+            else:
+                s['losses'] += 1
+            moves, total, longest = r[key]
+            s['moves'] += moves
+            s['time'] += total
+            s['max'] = max(s['max'], longest)
+    ratings = estimate_elo(names, results)
+    lines = []
+    for name in sorted(names, key=lambda n: -ratings[n]):
+        s = stats[name]
+        per_move = s['time'] / s['moves'] if s['moves'] else 0
+        lines.append(f'{name}: elo {ratings[name]:+.0f}; w/d/l {s["wins"]}/{s["draws"]}/{s["losses"]}; '
+                     f'ms/move {1000 * per_move:,.1f} (max {1000 * s["max"]:,.1f})')
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description='headless self-play tournament')
+    parser.add_argument('players', nargs='+', help='player specs, e.g. random minimax:depth=2')
+    parser.add_argument('--openings', type=int, default=10, help='openings per pairing, each played with both colours')
+    parser.add_argument('--opening-plies', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default='tournament.jsonl')
+    args = parser.parse_args()
+
+    players = [parse_player(spec) for spec in args.players]
+    openings = make_openings(args.openings, args.opening_plies, args.seed)
+    start = time.time()
+    results = run_tournament(players, openings, args.out, args.workers)
+    print(f'{len(results):,d} games in {time.time() - start:,.1f} seconds; results in {args.out}')
+    print(summarize(results))
+
+if __name__ == '__main__':
+    main()
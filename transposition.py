@@ -0,0 +1,79 @@
+import numpy as np
+
+EXACT = 0
+LOWER = 1 # value is a lower bound (search failed high)
+UPPER = 2 # value is an upper bound (search failed low)
+
+# key (8) + value (8) + depth, flag, move, generation (1 each)
+ENTRY_BYTES = 20
+
+
+def encode_move(move):
+    if not move:
+        return -1
+    return 8 * move[1] + move[0]
+
+def decode_move(m):
+    if m < 0:
+        return None
+    return (m & 7, m >> 3)
+
+
+class TranspositionTable:
+    def __init__(self, size_mb=16):
+        self.size = max(1, int(size_mb * 2**20) // ENTRY_BYTES)
+        self.keys = np.zeros(self.size, dtype=np.uint64)
+        self.values = np.zeros(self.size, dtype=np.float64)
+        self.depths = np.full(self.size, -1, dtype=np.int8) # -1 marks an empty slot
+        self.flags = np.zeros(self.size, dtype=np.int8)
+        self.moves = np.full(self.size, -1, dtype=np.int8)
+        self.generations = np.zeros(self.size, dtype=np.uint8)
+        self.generation = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def new_search(self):
+        # entries from earlier searches stay usable but become replaceable
+        self.generation = (self.generation + 1) % 256
+        self.reset_stats()
+
+    def clear(self):
+        self.depths[:] = -1
+        self.moves[:] = -1
+        self.generation = 0
+        self.reset_stats()
+
+    def probe(self, key):
+        i = key % self.size
+        if self.depths[i] < 0:
+            self.misses += 1
+            return None
+        if self.keys[i] != key:
+            self.collisions += 1
+            return None
+        self.hits += 1
+        return int(self.depths[i]), int(self.flags[i]), float(self.values[i]), decode_move(int(self.moves[i]))
+
+    def store(self, key, depth, flag, value, move):
+        # replacement policy: always take empty slots, the same position or
+        # entries left over from an earlier search, otherwise keep the deeper entry
+        i = key % self.size
+        if self.depths[i] >= 0 and self.keys[i] != key and self.generations[i] == self.generation and self.depths[i] > depth:
+            return
+        self.keys[i] = key
+        self.values[i] = value
+        self.depths[i] = min(depth, 127)
+        self.flags[i] = flag
+        self.moves[i] = encode_move(move)
+        self.generations[i] = self.generation
+        self.stores += 1
+
+    def stats(self):
+        probes = self.hits + self.misses + self.collisions
+        rate = self.hits / probes if probes else 0
+        return f'tt hits: {self.hits:,d}; misses: {self.misses:,d}; collisions: {self.collisions:,d}; hit rate: {rate:.1%}'